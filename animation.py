@@ -0,0 +1,101 @@
+import itertools
+
+from assets import cache
+
+ANIMATION_INTERVAL = 200  # мс симуляции на кадр анимации
+
+animation_ids = itertools.count(1)
+
+
+class Animation:
+    # Набор кадров из кеша ассетов (уже после convert_alpha) с масками. Создаётся один раз на набор кадров,
+    # дальше сущности сравнивают анимации по id, а не списки поверхностей
+    def __init__(self, frames, interval=ANIMATION_INTERVAL):
+        self.id = next(animation_ids)
+        self.frames = tuple(frames)
+        self.masks = tuple(cache.mask(frame) for frame in self.frames)
+        self.interval = interval
+
+    def __len__(self):
+        return len(self.frames)
+
+
+class AnimationClock:
+    # Общие часы всех анимаций одной скорости: номер шага растёт, когда с прошлого шага прошло больше interval
+    def __init__(self, interval):
+        self.interval = interval
+        self.timer = 0
+        self.count = 0
+
+    def reset(self, now):
+        self.timer = now
+        self.count = 0
+
+    def advance(self, now):
+        if now - self.timer > self.interval:
+            self.count += 1
+            self.timer = now
+
+
+class Animator:
+    # Центральный планировщик: часы двигаются один раз за шаг симуляции для всех сущностей сразу.
+    # Кадр сущности вычисляется из номера шага её часов, поэтому сущности с одной анимацией,
+    # запущенной в один момент (все монеты уровня), показывают один и тот же кадр без своих таймеров
+    def __init__(self):
+        self.clocks = {}
+        self.animations = {}
+
+    def animation(self, frames, interval=ANIMATION_INTERVAL):
+        # Один объект Animation на набор кадров из кеша — у всех экземпляров сущности одни id
+        key = (frames, interval)
+        animation = self.animations.get(key)
+        if animation is None:
+            animation = self.animations[key] = Animation(frames, interval)
+        return animation
+
+    def clock(self, interval):
+        clock = self.clocks.get(interval)
+        if clock is None:
+            clock = self.clocks[interval] = AnimationClock(interval)
+        return clock
+
+    def reset(self, now):
+        for clock in self.clocks.values():
+            clock.reset(now)
+
+    def advance(self, now):
+        for clock in self.clocks.values():
+            clock.advance(now)
+
+
+class Animated:
+    # Примесь для спрайтов: image и mask — текущий кадр анимации по общим часам
+    animation = None
+    clock = None
+    animation_start = 0
+
+    def play(self, animation):
+        # Новая анимация начинается с первого кадра; та же самая продолжается
+        if self.animation is not None and self.animation.id == animation.id:
+            return
+        self.animation = animation
+        self.clock = animator.clock(animation.interval)
+        self.animation_start = self.clock.count
+
+    def restart_animation(self):
+        self.animation_start = self.clock.count
+
+    @property
+    def frame(self):
+        return (self.clock.count - self.animation_start) % len(self.animation.frames)
+
+    @property
+    def image(self):
+        return self.animation.frames[self.frame]
+
+    @property
+    def mask(self):
+        return self.animation.masks[self.frame]
+
+
+animator = Animator()
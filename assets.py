@@ -0,0 +1,128 @@
+import pygame as pg
+
+from atlas import TextureAtlas
+
+TILE_PAGE_SIZE = 512
+
+
+class TileCache:
+    # Тайлы одного уровня: изображение gid из пакета масштабируется один раз и упаковывается в свой атлас.
+    # Уровень собирается со своим кешем (в том числе в потоке предзагрузки), общий кеш
+    # переключается на него в главном потоке, когда уровень становится текущим
+    def __init__(self, page_size=TILE_PAGE_SIZE):
+        self.atlas = TextureAtlas(page_size=page_size)
+        self.images = {}
+        self.hits = 0
+        self.misses = 0
+
+    def scaled(self, surface, size):
+        key = (surface, size)
+        image = self.images.get(key)
+        if image is None:
+            self.misses += 1
+            image = pg.transform.scale(surface.convert_alpha(), size)
+            image = self.atlas.add(key, image)
+            self.images[key] = image
+        else:
+            self.hits += 1
+        return image
+
+
+class AssetCache:
+    # Общий на весь процесс кеш изображений, кадров анимаций и масок.
+    # Ключ кадра — (путь, прямоугольник в листе, итоговый размер, отражение),
+    # convert_alpha выполняется один раз при первой загрузке. Готовые кадры упаковываются
+    # в атлас: персонажи и предметы — в общий, тайлы уровня — в атлас TileCache текущего уровня
+    def __init__(self):
+        self.atlas = TextureAtlas()
+        self.tiles = TileCache()
+        self.images = {}
+        self.frames = {}
+        self.strips = {}
+        self.masks = {}
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, table, key):
+        value = table.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def load(self, path):
+        image = self.lookup(self.images, path)
+        if image is None:
+            image = pg.image.load(path).convert_alpha()
+            self.images[path] = image
+        return image
+
+    def frame(self, path, rect=None, size=None, flip=False):
+        rect = tuple(rect) if rect is not None else None
+        size = (int(size[0]), int(size[1])) if size is not None else None
+        key = (path, rect, size, flip)
+        image = self.lookup(self.frames, key)
+        if image is None:
+            image = self.load(path)
+            if rect is not None:
+                image = image.subsurface(rect)
+            if size is not None:
+                image = pg.transform.scale(image, size)
+            if flip:
+                image = pg.transform.flip(image, True, False)
+            image = self.atlas.add(key, image)
+            if image.get_parent() is None and image is self.images.get(path):
+                image = image.copy()
+            self.frames[key] = image
+        return image
+
+    def strip(self, path, tile_size, count, scale=1, flip=False, y=0):
+        # Горизонтальная полоса кадров одинакового размера; список общий для всех экземпляров
+        size = (tile_size * scale, tile_size * scale)
+        key = (path, tile_size, count, size, flip, y)
+        frames = self.lookup(self.strips, key)
+        if frames is None:
+            frames = tuple(self.frame(path, (i * tile_size, y, tile_size, tile_size), size, flip)
+                           for i in range(count))
+            self.strips[key] = frames
+        return frames
+
+    def mask(self, surface):
+        mask = self.lookup(self.masks, surface)
+        if mask is None:
+            mask = pg.mask.from_surface(surface)
+            self.masks[surface] = mask
+        return mask
+
+    def use_tiles(self, tiles):
+        # Тайлы прошлого уровня остаются живы, пока на них ссылаются его спрайты
+        self.tiles = tiles
+
+    def stats(self):
+        # Кадры из атласа — подповерхности и своих пикселей не держат, считаются страницы
+        tiles = self.tiles
+        surfaces = set(self.images.values()) | set(self.frames.values()) | set(tiles.images.values())
+        surfaces = {s for s in surfaces if s.get_parent() is None}
+        surfaces.update(page.surface for page in self.atlas.pages + tiles.atlas.pages)
+        surface_bytes = sum(s.get_width() * s.get_height() * s.get_bytesize() for s in surfaces)
+        mask_bytes = sum((m.get_size()[0] * m.get_size()[1] + 7) // 8 for m in self.masks.values())
+        hits = self.hits + tiles.hits
+        misses = self.misses + tiles.misses
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else 0.0,
+            'images': len(self.images),
+            'frames': len(self.frames),
+            'tiles': len(tiles.images),
+            'masks': len(self.masks),
+            'atlas': self.atlas.stats(),
+            'tile_atlas': tiles.atlas.stats(),
+            'surface_bytes': surface_bytes,
+            'mask_bytes': mask_bytes,
+        }
+
+
+cache = AssetCache()
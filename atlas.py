@@ -0,0 +1,76 @@
+import threading
+
+import pygame as pg
+
+PAGE_SIZE = 1024
+
+
+class AtlasPage:
+    # Одна большая поверхность, заполняемая полками: кадры кладутся слева направо,
+    # новая полка начинается под самой высокой из предыдущих
+    def __init__(self, size):
+        self.size = size
+        self.surface = pg.Surface((size, size), pg.SRCALPHA).convert_alpha()
+        self.surface.fill((0, 0, 0, 0))
+        self.shelves = []
+        self.bottom = 0
+        self.used = 0
+
+    def place(self, width, height):
+        for shelf in self.shelves:
+            y, shelf_height, x = shelf
+            if height <= shelf_height and x + width <= self.size:
+                shelf[2] = x + width
+                return x, y
+        if self.bottom + height <= self.size and width <= self.size:
+            self.shelves.append([self.bottom, height, width])
+            self.bottom += height
+            return 0, self.bottom - height
+        return None
+
+
+class TextureAtlas:
+    # Упаковщик кадров в несколько больших поверхностей. Вместо отдельной поверхности
+    # на каждый кадр отдаётся подповерхность страницы атласа, regions — таблица кадров
+    def __init__(self, page_size=PAGE_SIZE):
+        self.page_size = page_size
+        self.pages = []
+        self.regions = {}
+        self.lock = threading.Lock()
+
+    def add(self, key, surface):
+        width, height = surface.get_size()
+        if width > self.page_size or height > self.page_size or not width or not height:
+            return surface
+        with self.lock:
+            if key in self.regions:
+                index, rect = self.regions[key]
+                return self.pages[index].surface.subsurface(rect)
+
+            position = None
+            for index, page in enumerate(self.pages):
+                position = page.place(width, height)
+                if position is not None:
+                    break
+            if position is None:
+                page = AtlasPage(self.page_size)
+                self.pages.append(page)
+                index = len(self.pages) - 1
+                position = page.place(width, height)
+
+            rect = pg.Rect(position, (width, height))
+            # Место на странице пустое, BLEND_RGBA_MAX копирует пиксели вместе с альфой без смешивания
+            page.surface.blit(surface, rect, special_flags=pg.BLEND_RGBA_MAX)
+            page.used += width * height
+            self.regions[key] = (index, rect)
+            return page.surface.subsurface(rect)
+
+    def stats(self):
+        area = len(self.pages) * self.page_size * self.page_size
+        return {
+            'pages': len(self.pages),
+            'regions': len(self.regions),
+            'fill': sum(page.used for page in self.pages) / area if area else 0.0,
+            'bytes': sum(page.surface.get_width() * page.surface.get_height() * page.surface.get_bytesize()
+                         for page in self.pages),
+        }
@@ -0,0 +1,257 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+# Иначе SDL перехватывает SIGTERM, и пул не может завершить рабочие процессы
+os.environ.setdefault('SDL_NO_SIGNAL_HANDLERS', '1')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import main
+from bench import make_trace
+from controls import ScriptedInput
+from levelpack import load_level
+from recording import Recording, ReplayInput
+
+# Параметры, которые можно перебирать: имя -> (объект, атрибут). crab_patrol — множитель
+# длины маршрута краба, он применяется к уже построенным крабам
+PARAMETERS = {
+    'gravity': (main, 'GRAVITY'),
+    'move_speed': (main, 'MOVE_SPEED'),
+    'jump_speed': (main, 'JUMP_SPEED'),
+    'crab_speed': (main.Crab, 'CRAB_MOVE_SPEED'),
+}
+DEFAULTS = {name: getattr(owner, attribute) for name, (owner, attribute) in PARAMETERS.items()}
+DEFAULTS['crab_patrol'] = 1.0
+
+
+def rush_policy(frames, seed):
+    # Бег вправо с прыжками через случайный период и редкими выстрелами
+    rng = random.Random(seed)
+    period = rng.randint(18, 40)
+    trace = []
+    for i in range(frames):
+        keys = ['d']
+        if i % period < 4:
+            keys.append('space')
+        if rng.random() < 0.03:
+            keys.append('left shift')
+        trace.append(keys)
+    return trace
+
+
+POLICIES = {
+    'trace': make_trace,  # отрезки бега в обе стороны, как в bench.py
+    'rush': rush_policy,
+}
+SESSION_PREFIX = 'session:'  # политика 'session:файл.rec' — ввод записанной партии (recording.py)
+
+
+def make_input(task):
+    policy = task['policy']
+    if policy.startswith(SESSION_PREFIX):
+        # С другими параметрами партия расходится с записью — контрольные точки не проверяются
+        return ReplayInput(Recording.load(policy[len(SESSION_PREFIX):]), strict=False)
+    return ScriptedInput(POLICIES[policy](task['frames'], task['seed']))
+
+
+class BalanceGame(main.Game):
+    # Прогон одного уровня: переход через портал не собирает следующий уровень, а завершает прогон
+    def __init__(self, level, patrol=1.0, **kwargs):
+        self.start_level = level
+        self.patrol = patrol
+        super(BalanceGame, self).__init__(headless=True, level=level, **kwargs)
+
+    def setup(self):
+        if self.level != self.start_level:
+            return
+        self.apply_level(self.build_level(self.level))
+
+    def build_level(self, level, cancelled=None, budget=None):
+        state = super(BalanceGame, self).build_level(level, cancelled, budget)
+        if state is not None and self.patrol != 1.0:
+            for crab in state.enemies:
+                span = crab.right_edge - crab.left_edge - crab.rect.width
+                crab.right_edge = crab.left_edge + crab.rect.width + round(span * self.patrol)
+        return state
+
+
+def apply_parameters(params):
+    for name, (owner, attribute) in PARAMETERS.items():
+        setattr(owner, attribute, params.get(name, DEFAULTS[name]))
+
+
+def simulate(task):
+    # Выполняется в рабочем процессе: одна партия на одном уровне до портала, смерти или лимита кадров
+    params = task['params']
+    apply_parameters(params)
+    game = BalanceGame(task['level'], patrol=params.get('crab_patrol', DEFAULTS['crab_patrol']),
+                       inputs=make_input(task), batched=task['batched'])
+    hp = game.player.hp
+    coins = game.coins_amount
+
+    start = time.perf_counter()
+    outcome = 'timeout'
+    frames = 0
+    while frames < task['frames']:
+        game.frame(render=False)
+        frames += 1
+        if game.level != task['level']:
+            outcome = 'portal'
+            break
+        if game.mode == 'game over':
+            outcome = 'died'
+            break
+
+    return dict(task, outcome=outcome, frames_played=frames, damage=hp - game.player.hp,
+                coins=game.money, coins_total=coins, seconds=time.perf_counter() - start)
+
+
+def task_key(task):
+    return json.dumps([task['level'], task['params'], task['policy'], task['seed']], sort_keys=True)
+
+
+def make_tasks(levels, grid, policies, sessions, runs, seed, frames, batched):
+    names = sorted(grid)
+    tasks = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        params = dict(zip(names, values))
+        for level in levels:
+            for policy in policies:
+                for run in range(runs):
+                    tasks.append({'level': level, 'params': params, 'policy': policy, 'seed': seed + run,
+                                  'frames': frames, 'batched': batched})
+        # Записанная партия детерминирована — один прогон на сочетание, на уровне самой записи
+        for path, recording in sessions:
+            tasks.append({'level': recording.level, 'params': params, 'policy': SESSION_PREFIX + path, 'seed': 0,
+                          'frames': min(frames, len(recording)), 'batched': batched})
+    return tasks
+
+
+def parse_grid(specs):
+    # --param gravity=1.2,1.5,1.8 -> {'gravity': [1.2, 1.5, 1.8]}
+    grid = {}
+    for spec in specs:
+        name, _, values = spec.partition('=')
+        if name not in DEFAULTS:
+            raise ValueError(f'неизвестный параметр {name}, есть: {", ".join(sorted(DEFAULTS))}')
+        grid[name] = [float(value) if '.' in value else int(value) for value in values.split(',')]
+    return grid
+
+
+class Summary:
+    # Сводка по группам (уровень, параметры, политика) копится по мере прихода результатов
+    def __init__(self):
+        self.groups = {}
+
+    def add(self, result):
+        key = json.dumps([result['level'], result['params'], result['policy']], sort_keys=True)
+        group = self.groups.setdefault(key, {
+            'level': result['level'], 'params': result['params'], 'policy': result['policy'],
+            'runs': 0, 'portal': 0, 'died': 0, 'timeout': 0, 'damage': 0, 'coins': 0, 'coins_total': 0,
+            'portal_frames': [],
+        })
+        group['runs'] += 1
+        group[result['outcome']] += 1
+        group['damage'] += result['damage']
+        group['coins'] += result['coins']
+        group['coins_total'] += result['coins_total']
+        if result['outcome'] == 'portal':
+            group['portal_frames'].append(result['frames_played'])
+
+    def report(self):
+        rows = []
+        for group in sorted(self.groups.values(), key=lambda g: (g['level'], json.dumps(g['params']), g['policy'])):
+            runs = group['runs']
+            frames = sorted(group['portal_frames'])
+            rows.append({
+                'level': group['level'],
+                'params': group['params'],
+                'policy': group['policy'],
+                'runs': runs,
+                'completion': group['portal'] / runs,
+                'deaths': group['died'] / runs,
+                'timeouts': group['timeout'] / runs,
+                'damage': group['damage'] / runs,
+                'coins': group['coins'] / runs,
+                'coin_share': group['coins'] / group['coins_total'] if group['coins_total'] else 0.0,
+                'frames_to_portal': {
+                    'mean': sum(frames) / len(frames) if frames else None,
+                    'p50': frames[len(frames) // 2] if frames else None,
+                },
+            })
+        return rows
+
+
+def read_done(path, summary):
+    # Уже записанные результаты учитываются в сводке и не пересчитываются
+    done = set()
+    with open(path, 'r') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            done.add(task_key(result))
+            summary.add(result)
+    return done
+
+
+def main_balance():
+    parser = argparse.ArgumentParser(description='Параллельный прогон уровней с разными параметрами физики')
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=V1,V2',
+                        help=f'значения параметра для перебора: {", ".join(sorted(DEFAULTS))}')
+    parser.add_argument('--levels', type=int, nargs='+', default=[1, 2])
+    parser.add_argument('--policy', nargs='+', choices=sorted(POLICIES), default=['trace', 'rush'])
+    parser.add_argument('--session', action='append', default=[], help='записанная партия как ещё одна политика')
+    parser.add_argument('--runs', type=int, default=8, help='прогонов на сочетание (разные seed)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--frames', type=int, default=3000, help='лимит кадров на прогон')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--batched', action='store_true')
+    parser.add_argument('--output', default='balance.jsonl', help='JSON lines, по строке на прогон')
+    parser.add_argument('--resume', action='store_true', help='дописать output, пропустив готовые прогоны')
+    args = parser.parse_args()
+
+    try:
+        grid = parse_grid(args.param)
+    except ValueError as error:
+        parser.error(str(error))
+    sessions = [(path, Recording.load(path)) for path in args.session]
+    tasks = make_tasks(args.levels, grid, args.policy, sessions, args.runs, args.seed, args.frames, args.batched)
+
+    # Пакеты уровней собираются заранее, чтобы рабочие процессы не пересобирали один файл одновременно
+    for level in sorted({task['level'] for task in tasks}):
+        load_level(f'maps/map{level}.tmx', f'crab_rect{level}.json').close()
+
+    summary = Summary()
+    if args.resume and os.path.exists(args.output):
+        done = read_done(args.output, summary)
+        tasks = [task for task in tasks if task_key(task) not in done]
+
+    # Рабочие процессы запускаются заново, а не форком: pygame уже инициализирован в этом процессе
+    start = time.perf_counter()
+    frames = 0
+    with open(args.output, 'a' if args.resume else 'w') as output, \
+            multiprocessing.get_context('spawn').Pool(args.workers) as pool:
+        for count, result in enumerate(pool.imap_unordered(simulate, tasks), 1):
+            output.write(json.dumps(result) + '\n')
+            output.flush()
+            summary.add(result)
+            frames += result['frames_played']
+            if count % 10 == 0 or count == len(tasks):
+                print(f'{count}/{len(tasks)}', file=sys.stderr)
+
+    elapsed = time.perf_counter() - start
+    print(f'{len(tasks)} прогонов, {args.workers} процессов: {elapsed:.1f} с, '
+          f'{frames / max(elapsed, 1e-9):.0f} кадров/с', file=sys.stderr)
+    print(json.dumps(summary.report(), indent=2))
+
+
+if __name__ == '__main__':
+    main_balance()
@@ -0,0 +1,322 @@
+import argparse
+import gc
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame as pg
+
+import main
+from assets import cache
+from controls import ScriptedInput
+from profiling import profiler
+from recording import Recording, ReplayInput
+from timing import FixedStep
+
+PHASES = ['event', 'update', 'streaming', 'fireballs', 'enemies', 'coins', 'portals', 'player', 'animation', 'draw', 'flip']
+
+
+def make_trace(frames, seed):
+    # Фиксированная трасса ввода: отрезки бега влево/вправо, прыжки и выстрелы
+    rng = random.Random(seed)
+    trace = []
+    while len(trace) < frames:
+        direction = rng.choice(['a', 'd', 'd', None])
+        jumping = rng.random() < 0.6
+        for i in range(rng.randint(20, 120)):
+            keys = [direction] if direction else []
+            if jumping and i % 25 < 4:
+                keys.append('space')
+            if rng.random() < 0.03:
+                keys.append('left shift')
+            trace.append(keys)
+    return trace[:frames]
+
+
+def make_synthetic_map(directory, source_level, repeat, crabs_per_block):
+    # Большая карта: исходная карта повторяется repeat раз по горизонтали
+    tree = ET.parse(f'maps/map{source_level}.tmx')
+    root = tree.getroot()
+    width = int(root.get('width'))
+    root.set('width', str(width * repeat))
+
+    for tileset in root.iter('tileset'):
+        tileset.set('source', os.path.abspath(os.path.join('maps', tileset.get('source'))))
+
+    for layer in root.iter('layer'):
+        layer.set('width', str(width * repeat))
+        data = layer.find('data')
+        rows = [row.rstrip(',') for row in data.text.strip().splitlines()]
+        data.text = '\n' + ',\n'.join(','.join([row] * repeat) for row in rows) + '\n'
+
+    map_path = os.path.join(directory, f'synthetic{source_level}x{repeat}.tmx')
+    tree.write(map_path, encoding='UTF-8', xml_declaration=True)
+
+    enemies = []
+    if os.path.exists(f'crab_rect{source_level}.json'):
+        with open(f'crab_rect{source_level}.json', 'r') as j:
+            enemies = json.load(j)['enemies']
+    crabs = []
+    for block in range(repeat):
+        for enemy in enemies:
+            for _ in range(crabs_per_block):
+                crabs.append({
+                    'name': enemy['name'],
+                    'start_pos': [enemy['start_pos'][0] + block * width, enemy['start_pos'][1]],
+                    'final_pos': [enemy['final_pos'][0] + block * width, enemy['final_pos'][1]],
+                })
+    enemies_path = os.path.join(directory, f'synthetic{source_level}x{repeat}.json')
+    with open(enemies_path, 'w') as j:
+        json.dump({'enemies': crabs}, j)
+
+    return map_path, enemies_path
+
+
+class BenchGame(main.Game):
+    def __init__(self, map_path=None, enemies_path=None, **kwargs):
+        self.map_path = map_path
+        self.enemies_path = enemies_path
+        super(BenchGame, self).__init__(headless=True, **kwargs)
+
+    def map_file(self, level):
+        return self.map_path or super(BenchGame, self).map_file(level)
+
+    def enemies_file(self, level):
+        return self.enemies_path or super(BenchGame, self).enemies_file(level)
+
+
+def percentiles(samples):
+    if not samples:
+        return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'mean': 0.0, 'max': 0.0}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {
+        'p50': pick(0.50),
+        'p95': pick(0.95),
+        'p99': pick(0.99),
+        'mean': sum(ordered) / len(ordered) * 1000,
+        'max': ordered[-1] * 1000,
+    }
+
+
+def replay(game, frames, render):
+    # Кадры идут через Game.frame. Часы планировщика считают кадры трассы — ровно по шагу симуляции
+    # на кадр; в записи сессии число шагов берётся из неё
+    game.scheduler = FixedStep(1, clock=itertools.count().__next__)
+    frame_times = []
+    for _ in range(frames):
+        if game.mode == 'complete':
+            break
+        start = time.perf_counter()
+        game.frame(render)
+        frame_times.append(time.perf_counter() - start)
+    return frame_times
+
+
+def run_scenario(name, trace, level=1, map_path=None, enemies_path=None, render=True, allocations=False,
+                 batched=False, recording=None):
+    # Сценарий — либо синтетическая трасса, либо записанная сессия (recording.py)
+    def new_game():
+        if recording is not None:
+            return BenchGame(map_path=map_path, enemies_path=enemies_path, level=recording.level,
+                             start_ticks=recording.start_ticks, inputs=ReplayInput(recording, strict=False),
+                             batched=batched)
+        return BenchGame(map_path=map_path, enemies_path=enemies_path, level=level, inputs=ScriptedInput(trace),
+                         batched=batched)
+
+    frames = len(recording) if recording is not None else len(trace)
+
+    game = new_game()
+    # Фоновая сборка следующего уровня и подготовка слоёв фона не должны попадать в замеры
+    game.preloader.wait()
+    if render:
+        game.setup_renderer()
+    counts = {
+        'platforms': len(game.platforms),
+        'coins': len(game.coins),
+        'enemies': len(game.enemies),
+    }
+
+    profiler.enable()
+    profiler.reset()
+    gc.collect()
+    gc_before = sum(stat['collections'] for stat in gc.get_stats())
+    frame_times = replay(game, frames, render)
+
+    result = {
+        'frames': len(frame_times),
+        'counts': counts,
+        'frame': percentiles(frame_times),
+        'phases': {phase: percentiles([frame.get(phase, 0.0) for frame in profiler.frames]) for phase in PHASES},
+        # Секции с бюджетом (слои фона): перцентили, бюджет и число кадров сверх него
+        'budgets': {name: dict(percentiles([frame.get(name, 0.0) for frame in profiler.frames]), budget=budget * 1000,
+                               over=sum(1 for frame in profiler.frames if frame.get(name, 0.0) > budget))
+                    for name, budget in profiler.budgets.items()},
+        'gc_collections': sum(stat['collections'] for stat in gc.get_stats()) - gc_before,
+        'fireball_pool': dict(game.fireball_pool.stats),
+        # Попадания и промахи общего кеша ресурсов, память его изображений, масок и атласов
+        'assets': cache.stats(),
+        # Неудачная фоновая сборка означает синхронную сборку уровня в кадре — её видно здесь
+        'preload': dict(game.preloader.stats,
+                        error=repr(game.preloader.error) if game.preloader.error is not None else None),
+    }
+    if recording is not None:
+        result['replay'] = {'checkpoints': game.input.checked, 'mismatches': len(game.input.mismatches)}
+    if game.streaming_map is not None:
+        budget = game.streaming_map.budget
+        result['streaming'] = dict(game.streaming_map.stats, resident=len(budget.chunks),
+                                   memory=budget.memory, memory_cap=budget.memory_cap)
+    profiler.disable()
+    profiler.reset()
+
+    if allocations:
+        # tracemalloc сильно замедляет кадр, поэтому аллокации меряются отдельным прогоном
+        game = new_game()
+        game.preloader.wait()
+        if render:
+            game.setup_renderer()
+        gc.collect()
+        tracemalloc.start()
+        replay(game, frames, render)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result['allocations'] = {'net_bytes': current, 'peak_bytes': peak}
+    print(f'{name}: {result["frames"]} frames, p50 {result["frame"]["p50"]:.3f} ms, '
+          f'p99 {result["frame"]["p99"]:.3f} ms', file=sys.stderr)
+    return result
+
+
+def measure_startup(runs):
+    # main.py целиком в отдельном процессе: игра сама пишет отметки этапов запуска и выходит
+    samples = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'startup.json')
+        env = dict(os.environ, PLATFORMER_STARTUP_PROBE=path)
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, 'main.py'], env=env, check=True, stdout=subprocess.DEVNULL)
+            samples.setdefault('process', []).append(time.perf_counter() - start)
+            with open(path, 'r') as f:
+                report = json.load(f)
+            for name, seconds in report['marks'].items():
+                samples.setdefault(name, []).append(seconds)
+    result = {name: percentiles(values) for name, values in samples.items()}
+    print(f'startup: first frame p50 {result["first_frame"]["p50"]:.1f} ms, '
+          f'first game frame p50 {result["first_game_frame"]["p50"]:.1f} ms', file=sys.stderr)
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    # Регрессия — рост p95 фазы больше чем на threshold относительно базового прогона
+    regressions = []
+
+    def check(label, stats, old_stats):
+        if not old_stats or old_stats['p95'] <= 0.01:
+            return
+        ratio = stats['p95'] / old_stats['p95']
+        if ratio > 1 + threshold:
+            regressions.append(f'{label}: p95 {old_stats["p95"]:.3f} -> {stats["p95"]:.3f} ms (x{ratio:.2f})')
+
+    for name, scenario in results['scenarios'].items():
+        old = baseline['scenarios'].get(name)
+        if old is None:
+            continue
+        for phase, stats in [('frame', scenario['frame'])] + list(scenario['phases'].items()):
+            check(f'{name}.{phase}', stats, old['frame'] if phase == 'frame' else old['phases'].get(phase))
+        for section, stats in scenario.get('budgets', {}).items():
+            check(f'{name}.{section}', stats, old.get('budgets', {}).get(section))
+    for mark, stats in results.get('startup', {}).items():
+        check(f'startup.{mark}', stats, baseline.get('startup', {}).get(mark))
+    return regressions
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description='Замеры времени кадра по фазам')
+    parser.add_argument('--frames', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=16, help='во сколько раз растянуть синтетическую карту')
+    parser.add_argument('--crabs-per-block', type=int, default=8)
+    parser.add_argument('--no-synthetic', action='store_true')
+    parser.add_argument('--no-render', action='store_true')
+    parser.add_argument('--allocations', action='store_true', help='дополнительный прогон с tracemalloc')
+    parser.add_argument('--batched', action='store_true', help='крабы и шары в numpy-хранилище')
+    parser.add_argument('--session', action='append', default=[], help='записанная сессия как ещё один сценарий')
+    parser.add_argument('--startup', type=int, default=0, metavar='RUNS', help='замерить запуск main.py RUNS раз')
+    parser.add_argument('--output', help='куда записать JSON (по умолчанию stdout)')
+    parser.add_argument('--baseline', help='JSON прошлого прогона для сравнения')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    args = parser.parse_args()
+
+    trace = make_trace(args.frames, args.seed)
+    options = {'render': not args.no_render, 'allocations': args.allocations, 'batched': args.batched}
+
+    scenarios = {}
+    for level in (1, 2, 3):
+        scenarios[f'map{level}'] = run_scenario(f'map{level}', trace, level=level, **options)
+
+    if not args.no_synthetic:
+        with tempfile.TemporaryDirectory() as directory:
+            map_path, enemies_path = make_synthetic_map(directory, 1, args.repeat, args.crabs_per_block)
+            name = f'synthetic_x{args.repeat}'
+            scenarios[name] = run_scenario(name, trace, map_path=map_path, enemies_path=enemies_path, **options)
+
+    for path in args.session:
+        name = os.path.splitext(os.path.basename(path))[0]
+        scenarios[name] = run_scenario(name, None, recording=Recording.load(path), **options)
+
+    results = {
+        'meta': {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'pygame': pg.version.ver,
+            'frames': args.frames,
+            'seed': args.seed,
+            'render': options['render'],
+            'batched': options['batched'],
+        },
+        'scenarios': scenarios,
+    }
+    if args.startup:
+        results['startup'] = measure_startup(args.startup)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for line in regressions:
+            print('REGRESSION', line, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,170 @@
+from profiling import profiler
+
+
+class SpatialGrid:
+    # Статический пространственный индекс: спрайты раскладываются по ячейкам
+    # равномерной сетки, запрос возвращает только спрайты из ячеек под прямоугольником
+    def __init__(self, cell_width, cell_height):
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.cells = {}
+        self.order = {}
+
+    def __len__(self):
+        return len(self.order)
+
+    def __iter__(self):
+        return iter(self.order)
+
+    def cell_range(self, rect):
+        x1 = rect.left // self.cell_width
+        y1 = rect.top // self.cell_height
+        x2 = (rect.right - 1) // self.cell_width
+        y2 = (rect.bottom - 1) // self.cell_height
+        return x1, y1, x2, y2
+
+    def add(self, sprite):
+        # Порядковый номер нужен, чтобы запросы возвращали спрайты в том же порядке,
+        # в каком их перебирала группа
+        self.order[sprite] = len(self.order)
+        x1, y1, x2, y2 = self.cell_range(sprite.rect)
+        for cy in range(y1, y2 + 1):
+            for cx in range(x1, x2 + 1):
+                self.cells.setdefault((cx, cy), []).append(sprite)
+
+    def remove(self, sprite):
+        if self.order.pop(sprite, None) is None:
+            return
+        x1, y1, x2, y2 = self.cell_range(sprite.rect)
+        for cy in range(y1, y2 + 1):
+            for cx in range(x1, x2 + 1):
+                cell = self.cells.get((cx, cy))
+                if cell and sprite in cell:
+                    cell.remove(sprite)
+
+    def query(self, rect):
+        x1, y1, x2, y2 = self.cell_range(rect)
+        found = set()
+        for cy in range(y1, y2 + 1):
+            for cx in range(x1, x2 + 1):
+                cell = self.cells.get((cx, cy))
+                if cell:
+                    found.update(cell)
+        profiler.count('collision_checks', len(found))
+        return sorted(found, key=self.order.__getitem__)
+
+
+
+def pixel_delta(position, delta):
+    # Сдвиг в целых пикселях с тем же округлением, что у присваивания дробной координаты Rect
+    target = position + delta
+    target = int(target + 0.5) if target >= 0 else -int(-target + 0.5)
+    return target - position
+
+
+class Contacts:
+    # С какими сторонами прямоугольник упёрся в твёрдые тайлы за последнее перемещение
+    def __init__(self):
+        self.grounded = False
+        self.ceiling = False
+        self.wall_left = False
+        self.wall_right = False
+
+    @property
+    def wall(self):
+        return self.wall_left or self.wall_right
+
+
+class SolidGrid:
+    # Твёрдость тайлов слоя platforms — битовая маска из пакета уровня, по биту на тайл, без копирования.
+    # Перемещение проверяет только тайлы, через которые проходит передний край прямоугольника,
+    # поэтому цена не зависит от размера карты, а результат — от порядка тайлов
+    def __init__(self, bitmap, width, height, tile_width, tile_height):
+        self.bitmap = bitmap
+        self.width = width
+        self.height = height
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+
+    def is_solid(self, tx, ty):
+        if 0 <= tx < self.width and 0 <= ty < self.height:
+            index = ty * self.width + tx
+            return bool(self.bitmap[index >> 3] & (1 << (index & 7)))
+        return False
+
+    def any_solid(self, tx1, tx2, ty1, ty2):
+        for ty in range(ty1, ty2 + 1):
+            for tx in range(tx1, tx2 + 1):
+                if self.is_solid(tx, ty):
+                    return True
+        return False
+
+    def overlaps(self, rect):
+        return self.any_solid(rect.left // self.tile_width, (rect.right - 1) // self.tile_width,
+                              rect.top // self.tile_height, (rect.bottom - 1) // self.tile_height)
+
+    def move(self, rect, dx, dy):
+        # Перемещение по осям — сначала x, потом y; rect сдвигается на месте до первого твёрдого тайла
+        contacts = Contacts()
+        dx = pixel_delta(rect.x, dx)
+        if dx:
+            self.sweep_x(rect, dx, contacts)
+        dy = pixel_delta(rect.y, dy)
+        if dy:
+            self.sweep_y(rect, dy, contacts)
+        return contacts
+
+    def sweep_x(self, rect, dx, contacts):
+        tw = self.tile_width
+        ty1 = rect.top // self.tile_height
+        ty2 = (rect.bottom - 1) // self.tile_height
+        if dx > 0:
+            for tx in range((rect.right - 1) // tw + 1, (rect.right - 1 + dx) // tw + 1):
+                if self.any_solid(tx, tx, ty1, ty2):
+                    rect.right = tx * tw
+                    contacts.wall_right = True
+                    return
+        else:
+            for tx in range(rect.left // tw - 1, (rect.left + dx) // tw - 1, -1):
+                if self.any_solid(tx, tx, ty1, ty2):
+                    rect.left = (tx + 1) * tw
+                    contacts.wall_left = True
+                    return
+        rect.x += dx
+
+    def sweep_y(self, rect, dy, contacts):
+        th = self.tile_height
+        tx1 = rect.left // self.tile_width
+        tx2 = (rect.right - 1) // self.tile_width
+        if dy > 0:
+            for ty in range((rect.bottom - 1) // th + 1, (rect.bottom - 1 + dy) // th + 1):
+                if self.any_solid(tx1, tx2, ty, ty):
+                    rect.bottom = ty * th
+                    contacts.grounded = True
+                    return
+        else:
+            for ty in range(rect.top // th - 1, (rect.top + dy) // th - 1, -1):
+                if self.any_solid(tx1, tx2, ty, ty):
+                    rect.top = (ty + 1) * th
+                    contacts.ceiling = True
+                    return
+        rect.y += dy
+
+
+def collide_masks(sprite, candidates):
+    # Двухфазная проверка: широкая фаза отбрасывает пары без пересечения прямоугольников,
+    # узкая сравнивает готовые маски кадров из кеша только для оставшихся пар
+    rect = sprite.rect
+    mask = sprite.mask
+    narrow = 0
+    hits = []
+    for other in candidates:
+        if not rect.colliderect(other.rect):
+            continue
+        narrow += 1
+        if mask.overlap(other.mask, (other.rect.x - rect.x, other.rect.y - rect.y)):
+            hits.append(other)
+    profiler.count('broad_pairs', len(candidates))
+    profiler.count('narrow_pairs', narrow)
+    profiler.count('contacts', len(hits))
+    return hits
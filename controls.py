@@ -0,0 +1,73 @@
+import pygame as pg
+
+
+class KeyState:
+    # Состояние клавиш в виде, совместимом с pg.key.get_pressed(): keys[pg.K_a] -> bool
+    def __init__(self, pressed=()):
+        self.pressed = frozenset(pressed)
+
+    def __getitem__(self, key):
+        return key in self.pressed
+
+    def __eq__(self, other):
+        return isinstance(other, KeyState) and self.pressed == other.pressed
+
+    def __hash__(self):
+        return hash(self.pressed)
+
+
+def key_code(key):
+    # Клавишу можно задать кодом (pg.K_a) или именем ('a', 'space', 'left shift')
+    if isinstance(key, str):
+        return pg.key.key_code(key)
+    return key
+
+
+class KeyboardInput:
+    # Живой ввод с клавиатуры и из очереди событий окна.
+    # Источник ввода решает и сколько шагов симуляции сделать в кадре (steps), и узнаёт о конце кадра
+    def poll(self):
+        return pg.event.get(), pg.key.get_pressed()
+
+    def steps(self, scheduled):
+        return scheduled
+
+    def end_frame(self, game, steps):
+        pass
+
+
+class ScriptedInput:
+    # Ввод по сценарию: на каждый вызов poll() берётся следующий кадр сценария.
+    # Кадр — набор зажатых клавиш; script может быть и функцией от номера кадра
+    def __init__(self, script, loop=False):
+        self.script = script
+        self.loop = loop
+        self.frame = 0
+        self.keys = KeyState()
+
+    def keys_at(self, frame):
+        if callable(self.script):
+            pressed = self.script(frame)
+        elif frame < len(self.script):
+            pressed = self.script[frame]
+        elif self.loop and self.script:
+            pressed = self.script[frame % len(self.script)]
+        else:
+            pressed = ()
+        return KeyState(key_code(key) for key in pressed)
+
+    def poll(self):
+        keys = self.keys_at(self.frame)
+        self.frame += 1
+
+        # Нажатия и отпускания превращаются в события, как их прислал бы SDL
+        events = [pg.event.Event(pg.KEYDOWN, key=key) for key in sorted(keys.pressed - self.keys.pressed)]
+        events += [pg.event.Event(pg.KEYUP, key=key) for key in sorted(self.keys.pressed - keys.pressed)]
+        self.keys = keys
+        return events, keys
+
+    def steps(self, scheduled):
+        return scheduled
+
+    def end_frame(self, game, steps):
+        pass
@@ -0,0 +1,175 @@
+import pygame as pg
+
+try:
+    import numpy as np
+except ImportError:  # пакетный режим необязателен, без numpy игра работает на обычных спрайтах
+    np = None
+
+
+def solid_from_bitmap(bitmap, width, height):
+    # Битовая маска твёрдых тайлов из пакета уровня -> булева сетка (строки — y)
+    bits = np.unpackbits(np.frombuffer(bitmap, dtype=np.uint8), bitorder='little')
+    return bits[:width * height].reshape(height, width).astype(bool)
+
+
+class BatchedSprite(pg.sprite.Sprite):
+    # Спрайт, который может быть представлением строки в пакетном хранилище
+    batch = None
+    batch_index = -1
+
+    def kill(self):
+        if self.batch is not None:
+            self.batch.remove(self)
+        super(BatchedSprite, self).kill()
+
+
+class EntityBatch:
+    # Хранилище структуры массивов: по numpy-массиву на поле, по строке на сущность.
+    # Спрайты остаются тонкими представлениями — после пакетного шага им
+    # переписывается rect, чтобы столкновения и отрисовка работали как раньше
+    fields = {}
+
+    def __init__(self, capacity=64):
+        self.sprites = []
+        self.size = 0
+        self.capacity = capacity
+        for name, dtype in self.fields.items():
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+
+    def __len__(self):
+        return self.size
+
+    def grow(self):
+        self.capacity *= 2
+        for name, dtype in self.fields.items():
+            array = np.zeros(self.capacity, dtype=dtype)
+            array[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, array)
+
+    def add(self, sprite, **values):
+        if self.size == self.capacity:
+            self.grow()
+        index = self.size
+        for name in self.fields:
+            getattr(self, name)[index] = values.get(name, 0)
+        self.sprites.append(sprite)
+        sprite.batch = self
+        sprite.batch_index = index
+        self.size += 1
+        return index
+
+    def remove(self, sprite):
+        # Удаление перестановкой последней строки на место удалённой
+        index = sprite.batch_index
+        last = self.size - 1
+        if index != last:
+            for name in self.fields:
+                array = getattr(self, name)
+                array[index] = array[last]
+            moved = self.sprites[last]
+            self.sprites[index] = moved
+            moved.batch_index = index
+        self.sprites.pop()
+        self.size -= 1
+        sprite.batch = None
+
+
+class CrabBatch(EntityBatch):
+    fields = {
+        'x': np.int32, 'y': np.int32, 'width': np.int32, 'height': np.int32,
+        'direction': np.int8, 'velocity_y': np.int32, 'gravity': np.int32, 'speed': np.int32,
+        'left_edge': np.int32, 'right_edge': np.int32,
+    } if np else {}
+
+    def __init__(self, solid, tile_width, tile_height, capacity=64):
+        super(CrabBatch, self).__init__(capacity)
+        # solid — булева сетка тайлов слоя platforms (строки — y)
+        self.solid = solid
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+
+    def add_crab(self, crab):
+        # Сдвиги за шаг должны быть меньше тайла — так на шаг приходится одна новая линия тайлов
+        assert crab.CRAB_MOVE_SPEED < self.tile_width and crab.CRAB_GRAVITY < self.tile_height
+        self.add(crab, x=crab.rect.x, y=crab.rect.y, width=crab.rect.width, height=crab.rect.height,
+                 direction=1 if crab.direction == 'right' else -1, velocity_y=crab.velocity_y,
+                 gravity=crab.gravity, speed=crab.CRAB_MOVE_SPEED,
+                 left_edge=crab.left_edge, right_edge=crab.right_edge)
+
+    def solid_at(self, tx, ty):
+        rows, columns = self.solid.shape
+        inside = (tx >= 0) & (ty >= 0) & (tx < columns) & (ty < rows)
+        result = np.zeros(len(tx), dtype=bool)
+        result[inside] = self.solid[ty[inside], tx[inside]]
+        return result
+
+    def edge_solid(self, fixed, start, end, columns):
+        # Есть ли твёрдый тайл на линии тайлов от start до end — столбец (columns) или строка
+        result = np.zeros(len(fixed), dtype=bool)
+        for offset in range(int((end - start).max()) + 1):
+            along = start + offset
+            valid = along <= end
+            if columns:
+                result |= valid & self.solid_at(fixed, along)
+            else:
+                result |= valid & self.solid_at(along, fixed)
+        return result
+
+    def sweep(self, position, size, delta, tile, cross_start, cross_end, columns):
+        # Векторный вариант SolidGrid.sweep_x/sweep_y для сдвигов меньше тайла: передний край
+        # пересекает не больше одной новой линии тайлов, её и проверяем
+        forward = delta > 0
+        edge = np.where(forward, position + size - 1, position)
+        line = (edge + delta) // tile
+        crossing = (delta != 0) & (line != edge // tile)
+        blocked = crossing & self.edge_solid(line, cross_start, cross_end, columns)
+        stopped = np.where(forward, line * tile - size, (line + 1) * tile)
+        return np.where(blocked, stopped, position + delta), blocked & forward, blocked & ~forward
+
+    def update(self):
+        n = self.size
+        if not n:
+            return
+        x, y = self.x[:n], self.y[:n]
+        width, height = self.width[:n], self.height[:n]
+        direction = self.direction[:n]
+        tw, th = self.tile_width, self.tile_height
+
+        # Патрулирование: скорость берётся по направлению до разворота, как в Crab.update
+        velocity_x = direction * self.speed[:n]
+        right = direction > 0
+        direction[right & (x + width >= self.right_edge[:n])] = -1
+        direction[~right & (x <= self.left_edge[:n])] = 1
+
+        # Перемещение по сетке твёрдых тайлов — сначала x, потом y, как SolidGrid.move
+        x[:], _, _ = self.sweep(x, width, velocity_x, tw, y // th, (y + height - 1) // th, True)
+        velocity_y = self.velocity_y[:n] + self.gravity[:n]
+        y[:], grounded, ceiling = self.sweep(y, height, velocity_y, th, x // tw, (x + width - 1) // tw, False)
+        self.velocity_y[:n][grounded | ceiling] = 0
+
+        for sprite, sx, sy, sd in zip(self.sprites, x.tolist(), y.tolist(), direction.tolist()):
+            sprite.rect.x = sx
+            sprite.rect.y = sy
+            sprite.direction = 'right' if sd > 0 else 'left'
+
+
+class FireballBatch(EntityBatch):
+    fields = {'x': np.int32, 'width': np.int32, 'velocity_x': np.int32} if np else {}
+
+    def add_ball(self, ball):
+        velocity = -ball.speed if ball.direction == 'left' else ball.speed
+        self.add(ball, x=ball.rect.x, width=ball.rect.width, velocity_x=velocity)
+
+    def update(self, left, right):
+        n = self.size
+        if not n:
+            return
+        x = self.x[:n]
+        x += self.velocity_x[:n]
+        for sprite, sx in zip(self.sprites, x.tolist()):
+            sprite.rect.x = sx
+
+        # Улетевшие за экран гасятся с конца, чтобы перестановки не сбивали индексы
+        gone = np.flatnonzero((x + self.width[:n] < left) | (x > right))
+        for index in gone[::-1].tolist():
+            self.sprites[index].kill()
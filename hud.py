@@ -0,0 +1,105 @@
+from collections import OrderedDict
+
+import pygame as pg
+
+TEXT_CACHE_SIZE = 256
+
+
+class TextCache:
+    # Отрисованные строки по (текст, цвет): шрифт растеризует каждую строку один раз
+    def __init__(self, font, limit=TEXT_CACHE_SIZE):
+        self.font = font
+        self.limit = limit
+        self.surfaces = OrderedDict()
+        self.renders = 0
+
+    def render(self, text, color):
+        key = (text, color)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.font.render(text, True, color)
+            self.renders += 1
+            self.surfaces[key] = surface
+            if len(self.surfaces) > self.limit:
+                self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(key)
+        return surface
+
+
+class Hud:
+    # Интерфейс поверх игры. Виджет по своему значению отдаёт готовые поверхности, они
+    # собираются в панель слоя; панель пересобирается только при смене значений её виджетов,
+    # каждый кадр на экран идёт одна готовая поверхность на слой
+    def __init__(self, font):
+        self.text = TextCache(font)
+        self.widgets = {}
+        self.values = {}
+        self.panels = {}
+        self.changed = set()
+
+    def add(self, name, layer, draw):
+        # draw(hud, value) -> [(поверхность, прямоугольник на экране)], виджеты слоя не перекрываются
+        self.widgets[name] = (layer, draw)
+        self.panels.setdefault(layer, None)
+        self.changed.add(layer)
+
+    def set(self, name, value):
+        if name not in self.values or self.values[name] != value:
+            self.values[name] = value
+            self.changed.add(self.widgets[name][0])
+
+    def compose(self, layer):
+        parts = []
+        for name, (widget_layer, draw) in self.widgets.items():
+            if widget_layer == layer and name in self.values:
+                parts += draw(self, self.values[name])
+        if not parts:
+            return None
+        area = parts[0][1].unionall([rect for _, rect in parts[1:]])
+        panel = pg.Surface(area.size, pg.SRCALPHA)
+        panel.fill((0, 0, 0, 0))
+        for surface, rect in parts:
+            # Панель прозрачная, а виджеты не перекрываются — пиксели копируются вместе с альфой
+            panel.blit(surface, rect.move(-area.x, -area.y), special_flags=pg.BLEND_RGBA_MAX)
+        return panel, area.topleft
+
+    def layers(self):
+        # [(слой, поверхность, позиция)] — в том же виде, что и спрайты для DirtyRectRenderer
+        for layer in self.changed:
+            self.panels[layer] = self.compose(layer)
+        self.changed.clear()
+        return [(layer, panel[0], panel[1]) for layer, panel in self.panels.items() if panel is not None]
+
+    def text_widget(self, value, color, **anchor):
+        if value is None:
+            return []
+        surface = self.text.render(value, color)
+        return [(surface, surface.get_rect(**anchor))]
+
+
+class LoadingScreen:
+    # Экран загрузки: заголовок, полоса прогресса и название текущего этапа.
+    # Рисуется, пока уровень собирается в фоне, поэтому ничего тяжёлого здесь не загружается
+    def __init__(self, screen, font, title, background='light blue'):
+        self.screen = screen
+        self.text = TextCache(font)
+        self.title = title
+        self.background = background
+
+    def draw(self, progress, stage):
+        width, height = self.screen.get_size()
+        self.screen.fill(self.background)
+        title = self.text.render(self.title, (0, 0, 0))
+        self.screen.blit(title, title.get_rect(center=(width // 2, height // 2 - 60)))
+
+        bar = pg.Rect(0, 0, width // 2, 24)
+        bar.center = (width // 2, height // 2)
+        pg.draw.rect(self.screen, 'black', bar, 2)
+        filled = bar.inflate(-6, -6)
+        filled.width = round(filled.width * min(max(progress, 0.0), 1.0))
+        pg.draw.rect(self.screen, 'red', filled)
+
+        if stage:
+            label = self.text.render(stage, (0, 0, 0))
+            self.screen.blit(label, label.get_rect(center=(width // 2, height // 2 + 50)))
@@ -0,0 +1,228 @@
+import array
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import xml.etree.ElementTree as ET
+
+import pygame as pg
+
+from assets import cache
+
+# Скомпилированный уровень: заголовок, JSON с метаданными и выровненные массивы.
+# Сетки слоёв — uint16 по строкам, карта столкновений — битовая маска по тайлам
+MAGIC = b'PLVL'
+VERSION = 1
+HEADER = struct.Struct('<4sII')
+PACK_DIR = 'compiled'  # Каталог пакетов рядом с картой: maps/compiled, у временных карт — во временном каталоге
+
+
+def pack_path(map_file, pack_dir=None):
+    name = os.path.splitext(os.path.basename(map_file))[0]
+    if pack_dir is None:
+        pack_dir = os.path.join(os.path.dirname(map_file), PACK_DIR)
+    return os.path.join(pack_dir, f'{name}.lvl')
+
+
+def source_files(map_file, enemies_file):
+    # Всё, от чего зависит пакет: сама карта, внешние .tsx и файл врагов
+    sources = [map_file]
+    root = ET.parse(map_file).getroot()
+    for tileset in root.iter('tileset'):
+        if tileset.get('source'):
+            sources.append(os.path.normpath(os.path.join(os.path.dirname(map_file), tileset.get('source'))))
+    sources.append(enemies_file)
+    return sources
+
+
+def file_digest(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def file_stamp(path):
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def recording_loader(filename, colorkey, **kwargs):
+    # Загрузчик для pytmx, который вместо изображений запоминает ссылки на них
+    def load_image(rect=None, flags=None):
+        flips = [bool(flags.flipped_horizontally), bool(flags.flipped_vertically),
+                 bool(flags.flipped_diagonally)] if flags else [False, False, False]
+        return {'path': filename, 'rect': list(rect) if rect else None, 'flags': flips, 'colorkey': colorkey}
+
+    return load_image
+
+
+def compile_level(map_file, enemies_file, output=None):
+    # pytmx нужен только для сборки пакета — когда пакет свежий, игра его не импортирует
+    import pytmx
+
+    output = output or pack_path(map_file)
+    tmx = pytmx.TiledMap(map_file, image_loader=recording_loader)
+
+    layers = []
+    arrays = []
+    for layer in tmx.visible_layers:
+        if not isinstance(layer, pytmx.TiledTileLayer):
+            continue
+        gids = array.array('H', (gid for row in layer.data for gid in row))
+        layers.append({'name': layer.name, 'array': len(arrays)})
+        arrays.append(gids.tobytes())
+
+    # Битовая маска твёрдых тайлов из слоя platforms
+    solid = bytearray((tmx.width * tmx.height + 7) // 8)
+    spawns = {'coin': [], 'portal': []}
+    for layer in tmx.visible_layers:
+        if not isinstance(layer, pytmx.TiledTileLayer):
+            continue
+        for x, y, gid in layer:
+            if not gid or tmx.images[gid] is None:
+                continue
+            if layer.name == 'platforms':
+                index = y * tmx.width + x
+                solid[index >> 3] |= 1 << (index & 7)
+            elif layer.name in spawns:
+                spawns[layer.name].append([x, y])
+    collision = {'array': len(arrays)}
+    arrays.append(bytes(solid))
+
+    enemies = []
+    if os.path.exists(enemies_file):
+        with open(enemies_file, 'r') as j:
+            enemies = json.load(j)['enemies']
+
+    sources = source_files(map_file, enemies_file)
+    meta = {
+        'width': tmx.width,
+        'height': tmx.height,
+        'tilewidth': tmx.tilewidth,
+        'tileheight': tmx.tileheight,
+        'tiles': tmx.images,
+        'layers': layers,
+        'collision': collision,
+        'spawns': spawns,
+        'enemies': enemies,
+        'sources': [{'path': path, 'stamp': file_stamp(path), 'sha1': file_digest(path)} for path in sources],
+    }
+
+    # Массивы выравниваются по 8 байт, их смещения дописываются в метаданные
+    meta_bytes = json.dumps(meta).encode()
+    offsets = []
+    while True:
+        offset = HEADER.size + len(meta_bytes)
+        offsets = []
+        for data in arrays:
+            offset = (offset + 7) & ~7
+            offsets.append([offset, len(data)])
+            offset += len(data)
+        meta['arrays'] = offsets
+        encoded = json.dumps(meta).encode()
+        stable = len(encoded) == len(meta_bytes)
+        meta_bytes = encoded
+        if stable:
+            break
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    temporary = output + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(meta_bytes)))
+        f.write(meta_bytes)
+        for (offset, _), data in zip(offsets, arrays):
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(data)
+    os.replace(temporary, output)
+    return output
+
+
+class LevelPack:
+    # Уровень, прочитанный из пакета через mmap: сетки слоёв — memoryview без копирования
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, meta_size = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path}: неподдерживаемый формат пакета уровня')
+        self.meta = json.loads(self.mm[HEADER.size:HEADER.size + meta_size])
+        view = memoryview(self.mm)
+        self.arrays = [view[offset:offset + size] for offset, size in self.meta['arrays']]
+
+        self.width = self.meta['width']
+        self.height = self.meta['height']
+        self.tilewidth = self.meta['tilewidth']
+        self.tileheight = self.meta['tileheight']
+        self.tiles = self.meta['tiles']
+        self.spawns = self.meta['spawns']
+        self.enemies = self.meta['enemies']
+        self.layers = [(layer['name'], self.arrays[layer['array']].cast('H')) for layer in self.meta['layers']]
+        self.collision = self.arrays[self.meta['collision']['array']]
+        self.images = {}
+
+    def is_fresh(self):
+        # Быстрая проверка по mtime и размеру, при расхождении — по содержимому
+        for source in self.meta['sources']:
+            if file_stamp(source['path']) != source['stamp'] and file_digest(source['path']) != source['sha1']:
+                return False
+        return True
+
+    def iter_layer(self, gids):
+        for index, gid in enumerate(gids):
+            yield index % self.width, index // self.width, gid
+
+    def get_tile_image_by_gid(self, gid):
+        image = self.images.get(gid)
+        if image is None and gid and self.tiles[gid] is not None:
+            image = self.images[gid] = self.load_tile(self.tiles[gid])
+        return image
+
+    def load_tile(self, tile):
+        # Исходный тайл — окно в листе тайлсета; в атлас попадает уже отмасштабированная копия
+        image = cache.load(tile['path'])
+        if tile['rect'] is not None:
+            image = image.subsurface(tile['rect'])
+        flipped_x, flipped_y, diagonal = tile['flags']
+        if diagonal:
+            image = pg.transform.flip(pg.transform.rotate(image, 270), True, False)
+        if flipped_x or flipped_y:
+            image = pg.transform.flip(image, flipped_x, flipped_y)
+        if tile['colorkey']:
+            image = image.copy()
+            image.set_colorkey(pg.Color(f"#{tile['colorkey']}"))
+        return image
+
+    def close(self):
+        self.layers = []
+        self.arrays = []
+        self.collision = None
+        self.mm.close()
+
+
+def load_level(map_file, enemies_file, pack_dir=None):
+    # Пакет пересобирается, если его нет, он другого формата или изменились исходники
+    path = pack_path(map_file, pack_dir)
+    if os.path.exists(path):
+        try:
+            pack = LevelPack(path)
+        except ValueError:
+            pack = None
+        if pack is not None and pack.is_fresh():
+            return pack
+        if pack is not None:
+            pack.close()
+    return LevelPack(compile_level(map_file, enemies_file, path))
+
+
+if __name__ == '__main__':
+    # Офлайн-сборка пакетов для всех карт: python levelpack.py [maps/mapN.tmx ...]
+    maps = sys.argv[1:] or sorted(os.path.join('maps', name) for name in os.listdir('maps')
+                                  if name.startswith('map') and name.endswith('.tmx'))
+    for map_file in maps:
+        level = os.path.splitext(os.path.basename(map_file))[0][len('map'):]
+        print(compile_level(map_file, f'crab_rect{level}.json'))
@@ -1,17 +1,50 @@
 import json
+import os
+import sys
+import time
+
+STARTUP_TIME = time.perf_counter()  # от этой точки, ещё до импорта pygame, считается время запуска
 
 import pygame as pg
-import pytmx
-from PIL.ImageChops import offset
-from Tools.scripts.highlight import html_highlight
-from matplotlib.pyplot import title
 
-pg.init()
+from animation import Animated, animator
+from assets import TileCache, cache
+from controls import KeyboardInput
+from hud import Hud, LoadingScreen
+from entities import BatchedSprite, CrabBatch, FireballBatch, np, solid_from_bitmap
+from collision import SolidGrid, SpatialGrid, collide_masks
+from render import CHUNK_SIZE, ChunkedLayer, DirtyRectRenderer, ParallaxBackground
+from streaming import STATIC_LAYERS, StreamBudget, StreamingMap
+from levelpack import load_level
+from pool import SpritePool
+from preload import LevelPreloader, OverBudget
+from profiling import ProfilerOverlay, profiler
+from recording import InputRecorder, Recording
+from timing import FixedStep, SimulationClock, StartupTimer
+
+startup = StartupTimer(STARTUP_TIME)
+startup.mark('imports')
+# Звук и джойстики игре не нужны — поднимаются только окно и шрифты
+pg.display.init()
+pg.font.init()
+startup.mark('pg_init')
 
 SCREEN_WIDTH = 1020
 SCREEN_HEIGHT = 760
 FPS = 80
+PROFILE_CAPTURE_FRAMES = 300
+TICK_RATE = 80  # Шагов симуляции в секунду, физика задана в единицах на шаг
+MAX_STEPS_PER_FRAME = 5
+COMPLETE_LEVEL = 3  # Переход на этот уровень завершает игру
+PRELOAD_BUDGET = 64 * 1024 * 1024  # Сколько байт поверхностей может занимать заранее собранный уровень
+STREAM_MAP_TILES = 256  # Карты шире или выше этого числа тайлов грузятся по чанкам
+FIREBALL_POOL_SIZE = 16  # Больше шаров одновременно на экране не бывает
+FIRE_COOLDOWN = 150  # мс симуляции между выстрелами
+LOADING_FPS = 30
+# Бюджеты этапов запуска в секундах от старта процесса; превышение печатается в stderr
+STARTUP_BUDGETS = {'window': 0.4, 'first_frame': 0.5, 'first_game_frame': 1.5}
 TILE_SCALE = 1
+TOP_DEPTH = float('inf')  # Глубина спрайтов, которые рисуются поверх всех слоёв карты
 GRAVITY = 1.5
 MOVE_SPEED = 10
 JUMP_SPEED = -20
@@ -19,31 +52,28 @@ MAX_FALL_SPEED = 14
 
 font = pg.font.Font(None, 40)
 
+sim_clock = SimulationClock(TICK_RATE)
+
 
 class Platform(pg.sprite.Sprite):
-    def __init__(self, image, x, y, width, height):
+    def __init__(self, image, x, y, width, height, tiles):
         super(Platform, self).__init__()
 
-        self.image = pg.transform.scale(image.convert_alpha(), (width * TILE_SCALE, height * TILE_SCALE))
+        # tiles — кеш тайлов уровня, которому принадлежит платформа
+        self.image = tiles.scaled(image, (width * TILE_SCALE, height * TILE_SCALE))
         self.rect = self.image.get_rect()
         self.rect.x = x * TILE_SCALE
         self.rect.y = y * TILE_SCALE
-        self.mask = pg.mask.from_surface(self.image)
 
 
-
-class Player(pg.sprite.Sprite):
+class Player(Animated, pg.sprite.Sprite):
     def __init__(self, map_width, map_height):
         super(Player, self).__init__()
         self.load_animations()  # Загрузка анимаций
-        self.current_animation = self.idle_animation_right
-        self.image = self.current_animation[0].convert_alpha()
-        self.current_image = 0
+        self.play(self.idle_animation_right)
         self.rect = self.image.get_rect()
         self.rect.center = (72, 832)
 
-        self.mask = pg.mask.from_surface(self.image)
-
         self.direction = 'right'
         # Начальные параметры движения и положения
         self.velocity_x = 0
@@ -53,81 +83,59 @@ class Player(pg.sprite.Sprite):
         self.map_width = map_width * TILE_SCALE
         self.map_height = map_height * TILE_SCALE
 
-        self.timer = pg.time.get_ticks()
-        self.interval = 200
-
         self.hp = 10  # Здоровье игрока
-        self.damage_timer = pg.time.get_ticks()
+        self.damage_timer = sim_clock.ticks()
         self.damage_interval = 1000
 
     def get_damage(self):
-        if pg.time.get_ticks() - self.damage_timer > self.damage_interval:
+        if sim_clock.ticks() - self.damage_timer > self.damage_interval:
             self.hp -= 5
-            self.damage_timer = pg.time.get_ticks()
+            self.damage_timer = sim_clock.ticks()
 
     def load_animations(self):
         tile_size = 32
         tile_scale = 2
 
-        self.idle_animation_right = []
-
-        num_images = 4
-        sptitesheet = pg.image.load('sprites/Sprite Pack 3/4 - Tommy/Idle_Poses (32 x 32).png')
-
-        for i in range(num_images):
-            x = i * tile_size
-            y = 0
-            rect = pg.Rect(x, y, tile_size, tile_size)
-            image = sptitesheet.subsurface(rect)
-            image = pg.transform.scale(image, (tile_size * tile_scale, tile_size * tile_scale))
-            self.idle_animation_right.append(image)
+        # Кадры берутся из общего кеша, все экземпляры делят одни и те же поверхности
+        idle = 'sprites/Sprite Pack 3/4 - Tommy/Idle_Poses (32 x 32).png'
+        self.idle_animation_right = animator.animation(cache.strip(idle, tile_size, 4, tile_scale))
+        self.idle_animation_left = animator.animation(cache.strip(idle, tile_size, 4, tile_scale, flip=True))
 
-        self.idle_animation_left = [pg.transform.flip(image, True, False) for image in self.idle_animation_right]
+        running = 'sprites/Sprite Pack 3/4 - Tommy/Running (32 x 32).png'
+        self.move_animation_right = animator.animation(cache.strip(running, tile_size, 8, tile_scale))
+        self.move_animation_left = animator.animation(cache.strip(running, tile_size, 8, tile_scale, flip=True))
 
-        self.move_animation_right = []
+        # Анимация покоя по id анимации бега
+        self.idle_after = {
+            self.move_animation_right.id: self.idle_animation_right,
+            self.move_animation_left.id: self.idle_animation_left,
+        }
 
-        num_images = 8
-        sptitesheet = pg.image.load('sprites/Sprite Pack 3/4 - Tommy/Running (32 x 32).png')
-
-        for i in range(num_images):
-            x = i * tile_size
-            y = 0
-            rect = pg.Rect(x, y, tile_size, tile_size)
-            image = sptitesheet.subsurface(rect)
-            image = pg.transform.scale(image, (tile_size * tile_scale, tile_size * tile_scale))
-            self.move_animation_right.append(image)
-
-        self.move_animation_left = [pg.transform.flip(image, True, False) for image in self.move_animation_right]
-
-    def update(self, platforms):
-        keys = pg.key.get_pressed()
+    def update(self, solids, keys):
         if keys[pg.K_SPACE] and not self.is_jumping:
             self.jump()
 
         if keys[pg.K_a]:
             self.direction = 'left'
             self.velocity_x = -MOVE_SPEED
-            self.switch_animation(self.move_animation_left)
+            self.play(self.move_animation_left)
         elif keys[pg.K_d]:
             self.direction = 'right'
             self.velocity_x = MOVE_SPEED
-            self.switch_animation(self.move_animation_right)
+            self.play(self.move_animation_right)
         else:
             self.velocity_x = 0
             self.switch_to_idle()
 
-        # Обработка горизонтального движения
-        self.rect.x += self.velocity_x
-        self.handle_horizontal_collisions(platforms)
-
         # Обработка вертикального движения и гравитации
         self.velocity_y += self.gravity
         self.velocity_y = min(self.velocity_y, MAX_FALL_SPEED)  # Ограничение скорости падения
-        self.rect.y += self.velocity_y
-        self.is_jumping = True
-        self.handle_vertical_collisions(platforms)
 
-        self.animate()
+        # Движение по сетке твёрдых тайлов: сначала по горизонтали, потом по вертикали
+        contacts = solids.move(self.rect, self.velocity_x, self.velocity_y)
+        self.is_jumping = not contacts.grounded
+        if contacts.grounded or contacts.ceiling:
+            self.velocity_y = 0
 
         # Ограничение перемещения по карте
         self.constrain_to_map()
@@ -137,50 +145,11 @@ class Player(pg.sprite.Sprite):
             self.velocity_y = JUMP_SPEED
             self.is_jumping = True
 
-    def switch_animation(self, new_animation):
-        # Переключение анимации персонажа, если текущая анимация отличается от новой
-        if self.current_animation != new_animation:
-            self.current_animation = new_animation
-            self.current_image = 0
-
     def switch_to_idle(self):
         # Переключение на анимацию покоя, если персонаж не двигается
-        if self.current_animation in [self.move_animation_right, self.move_animation_left]:
-            self.current_animation = self.idle_animation_right if self.current_animation == self.move_animation_right else self.idle_animation_left
-            self.current_image = 0
-
-    def handle_horizontal_collisions(self, platforms):
-        # Обработка горизонтальных столкновений с платформами
-        for platform in platforms:
-            if self.rect.colliderect(platform.rect):
-                # offset = (platform.rect.x - self.rect.x, platform.rect.y - self.rect.y)
-                # if self.mask.overlap(platform.mask, offset):
-                if self.velocity_x > 0:
-                    self.rect.right = platform.rect.left
-                elif self.velocity_x < 0:
-                    self.rect.left = platform.rect.right
-
-    def handle_vertical_collisions(self, platforms):
-        # Обработка вертикальных столкновений с платформами
-        for platform in platforms:
-            if self.rect.colliderect(platform.rect):
-                # offset = (platform.rect.x - self.rect.x, platform.rect.y - self.rect.y)
-                # if self.mask.overlap(platform.mask, offset):
-
-                if self.velocity_y > 0:  # Падение
-                    self.rect.bottom = platform.rect.top
-                    self.is_jumping = False
-                elif self.velocity_y < 0:  # Прыжок
-                    self.rect.top = platform.rect.bottom
-                self.velocity_y = 0
-
-    def animate(self):
-        # Обработка анимации персонажа
-        if pg.time.get_ticks() - self.timer > self.interval:
-            self.current_image = (self.current_image + 1) % len(self.current_animation)
-            self.image = self.current_animation[self.current_image].convert_alpha()
-            self.timer = pg.time.get_ticks()
-            self.mask = pg.mask.from_surface(self.image)
+        idle = self.idle_after.get(self.animation.id)
+        if idle is not None:
+            self.play(idle)
 
     def constrain_to_map(self):
         # Ограничение перемещения игрока в пределах карты
@@ -195,7 +164,7 @@ class Player(pg.sprite.Sprite):
             self.rect.right = self.map_width - 20
 
 
-class Crab(pg.sprite.Sprite):
+class Crab(Animated, BatchedSprite):
     # Параметры движения для краба
     CRAB_GRAVITY = 2
     CRAB_MOVE_SPEED = 2
@@ -203,9 +172,7 @@ class Crab(pg.sprite.Sprite):
     def __init__(self, map_width, map_height, start_pos, final_pos):
         super(Crab, self).__init__()
         self.load_animations()
-        self.current_animation = self.animation
-        self.image = self.current_animation[0]
-        self.current_image = 0
+        self.play(self.move_animation)
 
         self.rect = self.image.get_rect()
         self.rect.bottomleft = start_pos
@@ -219,21 +186,17 @@ class Crab(pg.sprite.Sprite):
         self.map_width = map_width * TILE_SCALE
         self.map_height = map_height * TILE_SCALE
 
-        self.timer = pg.time.get_ticks()
-        self.interval = 200
         self.direction = "right"
 
     def load_animations(self):
         tile_scale = 2
         tile_size = 32
-        self.animation = []
-        image = pg.image.load(
-            "sprites/Sprite Pack 2/Sprite Pack 2/9 - Snip Snap Crab/Movement_(Flip_image_back_and_forth) (32 x 32).png")
-        image = pg.transform.scale(image, (tile_size * tile_scale, tile_size * tile_scale))
-        self.animation.append(image)
-        self.animation.append(pg.transform.flip(image, True, False))
-
-    def update(self, platforms):
+        path = "sprites/Sprite Pack 2/Sprite Pack 2/9 - Snip Snap Crab/Movement_(Flip_image_back_and_forth) (32 x 32).png"
+        size = (tile_size * tile_scale, tile_size * tile_scale)
+        self.move_animation = animator.animation(
+            (cache.frame(path, size=size), cache.frame(path, size=size, flip=True)))
+
+    def update(self, solids):
         # Обновление направления движения краба и его положения
         if self.direction == "right":
             self.velocity_x = self.CRAB_MOVE_SPEED
@@ -244,48 +207,23 @@ class Crab(pg.sprite.Sprite):
             if self.rect.left <= self.left_edge:
                 self.direction = "right"
 
-        self.rect.x += self.velocity_x
-        self.rect.y += self.velocity_y + self.gravity
-
-        self.handle_platform_collisions(platforms)
-        self.animate()
-
-    def handle_platform_collisions(self, platforms):
-        # Обработка столкновений краба с платформами
-        for platform in platforms:
-            if platform.rect.collidepoint(self.rect.midbottom):
-                self.rect.bottom = platform.rect.top
-                self.velocity_y = 0
-
-            if platform.rect.collidepoint(self.rect.midtop):
-                self.rect.top = platform.rect.bottom
-                self.velocity_y = 0
-
-            if platform.rect.collidepoint(self.rect.midright):
-                self.rect.right = platform.rect.left
-
-            if platform.rect.collidepoint(self.rect.midleft):
-                self.rect.left = platform.rect.right
+        contacts = solids.move(self.rect, self.velocity_x, self.velocity_y + self.gravity)
+        if contacts.grounded or contacts.ceiling:
+            self.velocity_y = 0
 
-    def animate(self):
-        # Анимация движения краба
-        if pg.time.get_ticks() - self.timer > self.interval:
-            self.current_image += 1
-            if self.current_image >= len(self.current_animation):
-                self.current_image = 0
-            self.image = self.current_animation[self.current_image]
-            self.timer = pg.time.get_ticks()
+class Ball(BatchedSprite):
+    # Пул, в который шар возвращается после kill
+    pool = None
+    pooled = False
 
-class Ball(pg.sprite.Sprite):
     def __init__(self, player_rect, direction):
         super(Ball, self).__init__()
-
-        self.direction = direction
         self.speed = 10
+        self.image = cache.frame('sprites/fireball.png', size=(30, 30))
+        self.reset(player_rect, direction)
 
-        self.image = pg.image.load('sprites/fireball.png')
-        self.image = pg.transform.scale(self.image, (30, 30))
-
+    def reset(self, player_rect, direction):
+        self.direction = direction
         self.rect = self.image.get_rect()
 
         if self.direction == 'left':
@@ -295,245 +233,586 @@ class Ball(pg.sprite.Sprite):
 
         self.rect.y = player_rect.centery
 
-    def update(self):
+    def update(self, left, right):
         if self.direction == 'left':
             self.rect.x -= self.speed
         else:
             self.rect.x += self.speed
 
-        if self.rect.right < 0 or self.rect.left > SCREEN_WIDTH:
+        # left и right — края экрана в координатах мира
+        if self.rect.right < left or self.rect.left > right:
             self.kill()
 
-class Coin(pg.sprite.Sprite):
+    def kill(self):
+        super(Ball, self).kill()
+        if self.pool is not None:
+            self.pool.release(self)
+
+class Coin(Animated, pg.sprite.Sprite):
     def __init__(self, x, y):
         super(Coin, self).__init__()
         self.load_animations()
-        self.current_image = 0
-        self.image = self.images[0]
 
         self.rect = self.image.get_rect()
         self.rect.x = x
         self.rect.y = y
 
-        self.timer = pg.time.get_ticks()
-        self.interval = 200
-
     def load_animations(self):
         tile_scale = 1.5
         tile_size = 16
-        self.images = []
-        sptitesheet = pg.image.load(
-            "Coin_Gems/MonedaD.png")
-
-
-        for i in range(4):
-            x = i * tile_size
-            y = 0
-            rect = pg.Rect(x, y, tile_size, tile_size)
-            image = sptitesheet.subsurface(rect)
-            image = pg.transform.scale(image, (tile_size * tile_scale, tile_size * tile_scale))
-            self.images.append(image)
+        self.play(animator.animation(cache.strip("Coin_Gems/MonedaD.png", tile_size, 4, tile_scale)))
 
-    def update(self):
-        if pg.time.get_ticks() - self.timer > self.interval:
-            self.current_image += 1
-            if self.current_image >= len(self.images):
-                self.current_image = 0
-            self.image = self.images[self.current_image]
-            self.timer = pg.time.get_ticks()
-
-class Portal(pg.sprite.Sprite):
+class Portal(Animated, pg.sprite.Sprite):
     def __init__(self, x, y):
         super(Portal, self).__init__()
         self.load_animations()
-        self.current_image = 0
-        self.image = self.images[0]
-
-        self.mask = pg.mask.from_surface(self.image)
 
         self.rect = self.image.get_rect()
         self.rect.x = x
         self.rect.bottom = y
 
-        self.timer = pg.time.get_ticks()
-        self.interval = 200
-
     def load_animations(self):
         tile_scale = 1.5
         tile_size = 64
-        self.images = []
-        sptitesheet = pg.image.load(
-            "sprites\Green Portal Sprite Sheet.png").convert_alpha()
+        self.play(animator.animation(cache.strip("sprites/Green Portal Sprite Sheet.png", tile_size, 8, tile_scale)))
+
+
+# Замеры update каждой сущности включаются вместе с профайлером
+for entity in (Player, Crab, Ball):
+    profiler.instrument(entity)
+
+
+class LevelState:
+    # Всё, что строится при загрузке уровня, — собирается целиком и подставляется в Game
+    def __init__(self, level):
+        self.level = level
+        self.level_map = None
+        self.map_pixel_width = 0
+        self.map_pixel_height = 0
+        self.static_layer = None
+        self.overlay_layers = []  # [(глубина, слой)] — тайлы поверх монет и порталов нижних слоёв карты
+        self.tiles = TileCache()
+        self.solids = None
+        self.coin_grid = None
+        self.portal_grid = None
+        self.all_sprites = pg.sprite.Group()
+        self.platforms = pg.sprite.Group()
+        self.coins = pg.sprite.Group()
+        self.portals = pg.sprite.Group()
+        self.enemies = pg.sprite.Group()
 
+    def memory_size(self):
+        surfaces = {platform.image for platform in self.platforms}
+        size = sum(s.get_width() * s.get_height() * s.get_bytesize() for s in surfaces)
+        if self.static_layer is not None:
+            size += self.static_layer.memory_size()
+        size += sum(layer.memory_size() for _, layer in self.overlay_layers)
+        return size
 
-        for i in range(8):
-            x = i * tile_size
-            y = 0
-            rect = pg.Rect(x, y, tile_size, tile_size)
-            image = sptitesheet.subsurface(rect)
-            image = pg.transform.scale(image, (tile_size * tile_scale, tile_size * tile_scale))
-            self.images.append(image)
-
-    def update(self):
-        if pg.time.get_ticks() - self.timer > self.interval:
-            self.current_image += 1
-            if self.current_image >= len(self.images):
-                self.current_image = 0
-            self.image = self.images[self.current_image]
-            self.timer = pg.time.get_ticks()
 
 class Game:
-    def __init__(self):
+    def __init__(self, headless=False, inputs=None, level=1, start_ticks=0, batched=False, streaming=None):
+        self.headless = headless
+        # None — потоковая загрузка включается сама для больших карт
+        self.streaming = streaming
+        # Пакетный режим: крабы и огненные шары обновляются numpy-массивами целиком
+        self.batched = batched and np is not None
+        if headless:
+            # Без окна: SDL-драйвер dummy, отрисовка не вызывается
+            os.environ['SDL_VIDEODRIVER'] = 'dummy'
+            pg.display.quit()
+            pg.display.init()
         self.screen = pg.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pg.display.set_caption("Платформер")
-        self.level = 1
+        startup.mark('window')
+        # Фон и рендерер создаются при первой отрисовке — без окна они не нужны
+        self.background = None
+        self.renderer = None
+        self.dirty_rects = None
+        self.hud = Hud(font)
+        self.setup_hud()
+        self.level = level
+        self.input = inputs if inputs is not None else KeyboardInput()
+        # PLATFORMER_RECORD=файл — записать сессию для воспроизведения через recording.py
+        self.record_path = os.environ.get('PLATFORMER_RECORD')
+        if self.record_path:
+            self.recording = Recording(level, start_ticks)
+            self.input = InputRecorder(self.input, self.recording)
+        self.keys = None
+        self.is_running = False
+        self.scheduler = FixedStep(TICK_RATE, MAX_STEPS_PER_FRAME)
+        sim_clock.reset(start_ticks)
+        self.preloader = LevelPreloader(self.build_level, PRELOAD_BUDGET)
+        self.fireball_pool = SpritePool(Ball, FIREBALL_POOL_SIZE)
+        self.fireballs = pg.sprite.Group()
+        self.loading_progress = (0.0, None)
 
-        self.setup()
+        # F3 — оверлей профайлера, F4 — снять cProfile за PROFILE_CAPTURE_FRAMES кадров
+        self.overlay = None
+        if os.environ.get('PLATFORMER_PROFILE'):
+            self.toggle_profiler()
+
+        if headless:
+            self.setup()
+        else:
+            self.load()
+            self.run()
 
     # noinspection PyAttributeOutsideInit
 
+    def load(self):
+        # Окно с экраном загрузки показывается сразу, первый уровень собирается в фоне
+        loading = LoadingScreen(self.screen, font, 'Платформер')
+        clock = pg.time.Clock()
+        loading.draw(0.0, None)
+        pg.display.flip()
+        startup.mark('first_frame')
+
+        self.preloader.start(self.level, limited=False)
+        # Слои фона масштабируются в главном потоке по одному между кадрами экрана загрузки
+        self.background = ParallaxBackground((SCREEN_WIDTH, SCREEN_HEIGHT), deferred=True)
+        while self.preloader.running or self.background.pending:
+            for event in pg.event.get():
+                if event.type == pg.QUIT:
+                    self.preloader.discard()
+                    pg.quit()
+                    quit()
+            if self.background.pending:
+                progress = self.background.load_next()
+                if not self.preloader.running:
+                    self.report_loading(progress, 'Фон')
+            loading.draw(*self.loading_progress)
+            pg.display.flip()
+            clock.tick(LOADING_FPS)
+        self.setup_renderer()
+        self.setup()
+        startup.mark('level_ready')
+
+    def setup_renderer(self):
+        # Слои фона масштабируются один раз; пока камера упирается в край карты,
+        # обновляются только изменившиеся области экрана
+        if self.background is None:
+            self.background = ParallaxBackground((SCREEN_WIDTH, SCREEN_HEIGHT))
+        self.renderer = DirtyRectRenderer(self.screen, self.background)
+
+    def report_loading(self, progress, stage):
+        # Вызывается и из потока предзагрузки — экран загрузки только читает последнее значение
+        self.loading_progress = (progress, stage)
+
+    def report_startup(self):
+        report = startup.report(STARTUP_BUDGETS)
+        for name, seconds in report['over_budget'].items():
+            print(f'Запуск: {name} через {seconds * 1000:.0f} мс, бюджет {STARTUP_BUDGETS[name] * 1000:.0f} мс',
+                  file=sys.stderr)
+        # PLATFORMER_STARTUP_PROBE=файл — записать отчёт о запуске и выйти (так запуск замеряет bench.py)
+        probe = os.environ.get('PLATFORMER_STARTUP_PROBE')
+        if probe:
+            with open(probe, 'w') as f:
+                json.dump(report, f, indent=2)
+            self.is_running = False
+
     def setup(self):
+        # Если следующий уровень уже собран в фоне — просто подменяем состояние
+        state = self.preloader.take(self.level)
+        if state is None:
+            state = self.build_level(self.level)
+        self.apply_level(state)
+
+        if self.level + 1 < COMPLETE_LEVEL and os.path.exists(self.map_file(self.level + 1)):
+            self.preloader.start(self.level + 1)
+
+    def build_level(self, level, cancelled=None, budget=None):
+        # Сборка уровня без изменения текущей игры — может выполняться в рабочем потоке.
+        # Тайлы уровня идут в его собственный кеш, общий переключается на него в apply_level
+        state = LevelState(level)
+        self.report_loading(0.0, 'Карта')
+        # Разобранная карта берётся из скомпилированного пакета, он пересобирается при изменении исходников
+        state.level_map = load_level(self.map_file(level), self.enemies_file(level))
+        if cancelled is not None and cancelled.is_set():
+            return None
+        if budget is not None:
+            # Уровень, который не влезет в бюджет, не собирается вовсе — оценка по сеткам пакета
+            estimate = self.estimate_memory(state.level_map)
+            if estimate > budget:
+                state.level_map.close()
+                raise OverBudget(f'уровень {level}: ~{estimate} байт при бюджете {budget}')
+
+        self.load_map(state)
+        if cancelled is not None and cancelled.is_set():
+            return None
+        self.report_loading(0.9, 'Враги')
+
+        # Столкновения с платформами — по битовой маске твёрдых тайлов из пакета уровня
+        state.solids = SolidGrid(state.level_map.collision, state.level_map.width, state.level_map.height,
+                                 state.level_map.tilewidth * TILE_SCALE, state.level_map.tileheight * TILE_SCALE)
+
+        # Монеты и порталы тоже не двигаются — широкая фаза подбора идёт по их сеткам
+        state.coin_grid = SpatialGrid(state.level_map.tilewidth * TILE_SCALE, state.level_map.tileheight * TILE_SCALE)
+        for coin in state.coins:
+            state.coin_grid.add(coin)
+        state.portal_grid = SpatialGrid(state.level_map.tilewidth * TILE_SCALE, state.level_map.tileheight * TILE_SCALE)
+        for portal in state.portals:
+            state.portal_grid.add(portal)
+
+        for enemy in state.level_map.enemies:
+            if enemy["name"] == 'Crab':
+                x1 = enemy["start_pos"][0] * TILE_SCALE * state.level_map.tilewidth
+                y1 = enemy["start_pos"][1] * TILE_SCALE * state.level_map.tilewidth
 
-        self.mode = 'game'
-        self.clock = pg.time.Clock()
-        self.is_running = False
+                x2 = enemy["final_pos"][0] * TILE_SCALE * state.level_map.tilewidth
+                y2 = enemy["final_pos"][1] * TILE_SCALE * state.level_map.tilewidth
+                crab = Crab(state.map_pixel_width, state.map_pixel_height, [x1, y1], [x2, y2])
+                state.enemies.add(crab)
 
-        self.all_sprites = pg.sprite.Group()
-        self.platforms = pg.sprite.Group()
+        self.report_loading(1.0, None)
+        return state
 
-        self.tmx_map = pytmx.load_pygame(f'maps/map{self.level}.tmx')
+    def apply_level(self, state):
+        self.mode = 'game'
+        self.clock = pg.time.Clock()
+        cache.use_tiles(state.tiles)
+
+        self.level_map = state.level_map
+        self.map_pixel_width = state.map_pixel_width
+        self.map_pixel_height = state.map_pixel_height
+        self.static_layer = state.static_layer
+        self.overlay_layers = state.overlay_layers
+        self.streaming_map = state.static_layer if isinstance(state.static_layer, StreamingMap) else None
+        if self.renderer is not None:
+            self.renderer.reset()
+        self.platforms = state.platforms
+        self.solids = state.solids
+        self.coin_grid = state.coin_grid
+        self.portal_grid = state.portal_grid
+        self.coins = state.coins
+        self.coins_amount = len(self.coins.sprites())  # новая строка
+        self.portals = state.portals
+        self.enemies = state.enemies
+        # Шары прошлого уровня возвращаются в пул
+        for ball in self.fireballs.sprites():
+            ball.kill()
+        self.fireballs = pg.sprite.Group()
+        self.fire_timer = sim_clock.ticks() - FIRE_COOLDOWN
 
         self.money = 0
-        self.coins = pg.sprite.Group()
-
-        self.portals = pg.sprite.Group()
-
-        self.load_map()
 
         self.player = Player(self.map_pixel_width, self.map_pixel_height)
-        self.all_sprites.add(self.player)
 
-        self.enemies = pg.sprite.Group()
-
-        self.fireballs = pg.sprite.Group()
-
-
-        with open(f'crab_rect{self.level}.json', 'r') as j:
-            data = json.load(j)
+        # Порядок отрисовки как при загрузке: монеты и порталы, игрок, враги
+        self.spawn_sprites = state.all_sprites.sprites()
+        self.all_sprites = pg.sprite.Group()
+        self.all_sprites.add(*self.spawn_sprites)
+        self.all_sprites.add(self.player)
+        self.all_sprites.add(*self.enemies.sprites())
 
-        for enemy in data['enemies']:
-            if enemy["name"] == 'Crab':
-                x1 = enemy["start_pos"][0] * TILE_SCALE * self.tmx_map.tilewidth
-                y1 = enemy["start_pos"][1] * TILE_SCALE * self.tmx_map.tilewidth
+        # Уровень мог быть собран заранее — анимации отсчитываются от момента входа
+        animator.reset(sim_clock.ticks())
+        for sprite in self.all_sprites:
+            sprite.restart_animation()
 
-                x2 = enemy["final_pos"][0] * TILE_SCALE * self.tmx_map.tilewidth
-                y2 = enemy["final_pos"][1] * TILE_SCALE * self.tmx_map.tilewidth
-                print(x1, x2, y1, y2)
-                crab = Crab(self.map_pixel_width, self.map_pixel_height, [x1, y1], [x2, y2])
-                self.enemies.add(crab)
-                self.all_sprites.add(crab)
+        self.crab_batch = self.fireball_batch = None
+        if self.batched:
+            solid = solid_from_bitmap(self.level_map.collision, self.level_map.width, self.level_map.height)
+            self.crab_batch = CrabBatch(solid, self.level_map.tilewidth * TILE_SCALE,
+                                        self.level_map.tileheight * TILE_SCALE)
+            for crab in self.enemies:
+                self.crab_batch.add_crab(crab)
+            self.fireball_batch = FireballBatch()
 
         self.camera_x = 0
         self.camera_y = 0
         self.camera_speed = 4
 
-        self.run()
-
-    def load_map(self):
-        self.map_pixel_width = self.tmx_map.width * self.tmx_map.tilewidth * TILE_SCALE
-        self.map_pixel_height = self.tmx_map.height * self.tmx_map.tileheight * TILE_SCALE
-
-        for layer in self.tmx_map:
-            if layer.name == 'platforms':
-                for x, y, gid in layer:
-                    tile = self.tmx_map.get_tile_image_by_gid(gid)
-                    if tile:
-                        platform = Platform(tile, x * self.tmx_map.tilewidth, y * self.tmx_map.tileheight,
-                                            self.tmx_map.tilewidth, self.tmx_map.tileheight)
-                        self.all_sprites.add(platform)
-                        self.platforms.add(platform)
-            elif layer.name == 'decorations':
-                for x, y, gid in layer:
-                    tile = self.tmx_map.get_tile_image_by_gid(gid)
-                    if tile:
-                        platform = Platform(tile, x * self.tmx_map.tilewidth, y * self.tmx_map.tileheight,
-                                            self.tmx_map.tilewidth, self.tmx_map.tileheight)
-                        self.all_sprites.add(platform)
-            elif layer.name == 'coin':
-                for x, y, gid in layer:
-                    tile = self.tmx_map.get_tile_image_by_gid(gid)
-                    if tile:
-                        coin = Coin(x * self.tmx_map.tilewidth, y * self.tmx_map.tileheight)
-                        self.all_sprites.add(coin)
-                        self.coins.add(coin)
-                    self.coins_amount = len(self.coins.sprites())  # новая строка
-
-            elif layer.name == 'portal':
-                for x, y, gid in layer:
-                    tile = self.tmx_map.get_tile_image_by_gid(gid)
+        # Положения до последнего шага симуляции — для интерполяции при отрисовке
+        self.previous_positions = {}
+        self.previous_camera = None
+
+        if self.streaming_map is not None:
+            for coin in self.coins:
+                self.streaming_map.track(coin)
+            self.stream_map()
+
+    def stream_map(self):
+        # Подгрузка чанков вокруг камеры. Монеты замораживаются и возвращаются целыми чанками — только когда
+        # чанк выходит из активной области или входит в неё. Крабы ходят, поэтому у каждого живого краба
+        # проверяется его чанк; замороженные в обход не попадают
+        view = pg.Rect(self.camera_x, self.camera_y, SCREEN_WIDTH, SCREEN_HEIGHT)
+        # Базовый и накладные слои делят один бюджет памяти — обновляются вместе
+        self.streaming_map.update(view)
+        entered, left = self.streaming_map.activate(view)
+
+        changed = False
+        for key in left:
+            for coin in self.streaming_map.freeze_chunk(key):
+                coin.kill()
+                self.coin_grid.remove(coin)
+                changed = True
+        for crab in self.enemies.sprites():
+            if not self.streaming_map.is_active(crab):
+                crab.kill()
+                self.streaming_map.freeze(crab)
+                changed = True
+        for sprite in self.streaming_map.thaw(entered):
+            if isinstance(sprite, Crab):
+                self.enemies.add(sprite)
+                if self.crab_batch is not None:
+                    self.crab_batch.add_crab(sprite)
+            else:
+                self.coins.add(sprite)
+                self.coin_grid.add(sprite)
+                self.streaming_map.track(sprite)
+            changed = True
+
+        if changed:
+            # Порядок отрисовки как при загрузке уровня
+            self.all_sprites = pg.sprite.Group()
+            self.all_sprites.add(*[sprite for sprite in self.spawn_sprites if sprite.alive()])
+            self.all_sprites.add(self.player, *self.enemies.sprites(), *self.fireballs.sprites())
+
+    def estimate_memory(self, level_map):
+        # Сколько займёт собранный уровень (как LevelState.memory_size) — до масштабирования и запекания:
+        # чанки статических слоёв, в которых есть тайлы, и тайлы платформ. Потоковые карты чанки в фоне не строят
+        if self.is_streaming(level_map):
+            return 0
+        tile_width = level_map.tilewidth * TILE_SCALE
+        tile_height = level_map.tileheight * TILE_SCALE
+        chunks = 0
+        platform_gids = set()
+        for name, gids in level_map.layers:
+            if name not in STATIC_LAYERS:
+                continue
+            keys = set()
+            for x, y, gid in level_map.iter_layer(gids):
+                if gid and level_map.tiles[gid] is not None:
+                    keys.add((x * tile_width // CHUNK_SIZE, y * tile_height // CHUNK_SIZE))
+                    if name == 'platforms':
+                        platform_gids.add(gid)
+            chunks += len(keys)
+        return (chunks * CHUNK_SIZE * CHUNK_SIZE + len(platform_gids) * tile_width * tile_height) * 4
+
+    def is_streaming(self, level_map):
+        if self.streaming is not None:
+            return self.streaming
+        return level_map.width > STREAM_MAP_TILES or level_map.height > STREAM_MAP_TILES
+
+    def map_file(self, level):
+        return f'maps/map{level}.tmx'
+
+    def enemies_file(self, level):
+        return f'crab_rect{level}.json'
+
+    def load_map(self, state):
+        level_map = state.level_map
+        state.map_pixel_width = level_map.width * level_map.tilewidth * TILE_SCALE
+        state.map_pixel_height = level_map.height * level_map.tileheight * TILE_SCALE
+
+        # Платформы и декорации не двигаются — они запекаются в чанки, а не рисуются по одному.
+        # Слои рисуются в порядке карты: тайлы до первого слоя монет или порталов уходят в фон (глубина 0),
+        # тайлы более поздних слоёв — в накладные слои поверх спрайтов нижних слоёв
+        static_tiles = {}
+        static_names = {}
+        streaming = self.is_streaming(level_map)
+        spawned = False
+
+        for index, (name, layer) in enumerate(level_map.layers):
+            self.report_loading(0.1 + 0.8 * index / len(level_map.layers), 'Тайлы и спрайты')
+            depth = index + 1 if spawned else 0
+            if name in STATIC_LAYERS:
+                static_names.setdefault(depth, []).append(name)
+                tiles = static_tiles.setdefault(depth, [])
+                if streaming:
+                    continue
+                for x, y, gid in level_map.iter_layer(layer):
+                    tile = level_map.get_tile_image_by_gid(gid)
                     if tile:
-                        portal = Portal(x * self.tmx_map.tilewidth, y * self.tmx_map.tileheight)
-                        self.all_sprites.add(portal)
-                        self.portals.add(portal)
+                        platform = Platform(tile, x * level_map.tilewidth, y * level_map.tileheight,
+                                            level_map.tilewidth, level_map.tileheight, state.tiles)
+                        tiles.append(platform)
+                        if name == 'platforms':
+                            state.platforms.add(platform)
+            elif name == 'coin':
+                spawned = True
+                for x, y in level_map.spawns['coin']:
+                    coin = Coin(x * level_map.tilewidth, y * level_map.tileheight)
+                    coin.depth = index + 1
+                    state.all_sprites.add(coin)
+                    state.coins.add(coin)
+
+            elif name == 'portal':
+                spawned = True
+                for x, y in level_map.spawns['portal']:
+                    portal = Portal(x * level_map.tilewidth, y * level_map.tileheight)
+                    portal.depth = index + 1
+                    state.all_sprites.add(portal)
+                    state.portals.add(portal)
+
+        if streaming:
+            # Большая карта: платформы и графика строятся по чанкам вокруг камеры во время игры,
+            # все её слои укладываются в один общий бюджет памяти
+            budget = StreamBudget()
+
+            def make_layer(depth):
+                return StreamingMap(
+                    level_map, lambda tile, x, y: Platform(tile, x, y, level_map.tilewidth, level_map.tileheight,
+                                                           state.tiles),
+                    state.platforms, TILE_SCALE, budget=budget, layers=static_names.get(depth, ()))
+        else:
+            def make_layer(depth):
+                return ChunkedLayer(static_tiles.get(depth, ()), state.map_pixel_width, state.map_pixel_height)
+        state.static_layer = make_layer(0)
+        state.overlay_layers = [(depth, make_layer(depth)) for depth in sorted(static_tiles) if depth]
 
-    def run(self):
+    def run(self, render=True):
         self.is_running = True
-        while self.is_running:
-            self.event()
-            self.update()
-            self.draw()
-            self.clock.tick(FPS)
+        self.scheduler.reset()
+        while self.is_running and self.mode != 'complete':
+            self.frame(render)
+            if 'first_game_frame' not in startup.marks:
+                startup.mark('first_game_frame')
+                self.report_startup()
+        if self.record_path:
+            self.recording.save(self.record_path)
         pg.quit()
         quit()
 
+    def frame(self, render=True):
+        profiler.begin_frame()
+        self.event()
+        if render:
+            # При воспроизведении записи число шагов берётся из неё, а не из часов
+            steps = self.input.steps(self.scheduler.advance())
+            for _ in range(steps):
+                self.tick()
+            self.draw(self.scheduler.alpha)
+            if not self.headless:
+                self.clock.tick(FPS)
+        else:
+            # Без отрисовки симуляция идёт с максимальной скоростью
+            steps = self.input.steps(1)
+            for _ in range(steps):
+                self.tick()
+        self.input.end_frame(self, steps)
+        profiler.end_frame()
+
+    def tick(self):
+        self.previous_positions = {sprite: sprite.rect.topleft for sprite in self.all_sprites}
+        self.previous_camera = (self.camera_x, self.camera_y)
+        with profiler.section('update'):
+            self.update()
+        sim_clock.advance()
+
+    def step(self, n=1):
+        # Headless-прогон: n кадров ввода и шагов симуляции без отрисовки
+        for _ in range(n):
+            if self.mode == 'complete':
+                break
+            self.frame(render=False)
+        return self
+
     def event(self):
-        for event in pg.event.get():
-            keys = pg.key.get_pressed()
+        with profiler.section('event'):
+            self.handle_events()
+
+    def handle_events(self):
+        events, self.keys = self.input.poll()
+        for event in events:
             if event.type == pg.QUIT:
                 self.is_running = False
 
+            if event.type == pg.KEYDOWN and event.key == pg.K_F3:
+                self.toggle_profiler()
+                continue
+            if event.type == pg.KEYDOWN and event.key == pg.K_F4:
+                if not profiler.enabled:
+                    self.toggle_profiler()
+                profiler.capture(PROFILE_CAPTURE_FRAMES, f'profile_{sim_clock.ticks()}')
+                continue
+
             if self.mode == 'game over':
                 if event.type == pg.KEYDOWN:
                     self.setup()
 
-            if keys[pg.K_LSHIFT]:
-                self.fireball = Ball(self.player.rect, self.player.direction)
-                self.fireballs.add(self.fireball)
-                self.all_sprites.add(self.fireball)
+            if self.keys[pg.K_LSHIFT]:
+                self.fire()
 
-        collisions = pg.sprite.groupcollide(self.fireballs, self.enemies, True, True)
-        collisions = pg.sprite.groupcollide(self.fireballs, self.platforms, True, False)
+    def fire(self):
+        # Не чаще раза в FIRE_COOLDOWN, сколько бы событий ни накопилось в очереди
+        if sim_clock.ticks() - self.fire_timer < FIRE_COOLDOWN:
+            return
+        ball = self.fireball_pool.acquire(self.player.rect, self.player.direction)
+        if ball is None:
+            return
+        self.fire_timer = sim_clock.ticks()
+        self.fireballs.add(ball)
+        self.all_sprites.add(ball)
+        if self.fireball_batch is not None:
+            self.fireball_batch.add_ball(ball)
+
+    def toggle_profiler(self):
+        if self.overlay is None:
+            profiler.enable(history=ProfilerOverlay.GRAPH_WIDTH)
+            self.overlay = ProfilerOverlay(profiler, pg.font.Font(None, 22))
+        else:
+            profiler.disable()
+            self.overlay = None
 
     def update(self):
+        if self.streaming_map is not None:
+            with profiler.section('streaming'):
+                self.stream_map()
+
+        with profiler.section('fireballs'):
+            pg.sprite.groupcollide(self.fireballs, self.enemies, True, True)
+            for ball in self.fireballs.sprites():
+                if self.solids.overlaps(ball.rect):
+                    ball.kill()
+            profiler.count('fireballs_active', len(self.fireball_pool))
+
         if self.player.hp <= 0:
             self.mode = 'game over'
             return
 
-        for enemy in self.enemies.sprites():
-            enemy.update(self.platforms)
-            if pg.sprite.collide_mask(self.player, enemy):
+        with profiler.section('enemies'):
+            if self.crab_batch is not None:
+                self.crab_batch.update()
+            else:
+                for enemy in self.enemies.sprites():
+                    enemy.update(self.solids)
+            # Крабы двигаются, поэтому широкая фаза для них — просто прямоугольники всей группы
+            for enemy in collide_masks(self.player, self.enemies.sprites()):
                 self.player.get_damage()
 
-        for coin in self.coins.sprites():
-            #coin.update(self.platforms)
-            if pg.sprite.collide_mask(self.player, coin):
+        with profiler.section('coins'):
+            for coin in collide_masks(self.player, self.coin_grid.query(self.player.rect)):
+                self.coin_grid.remove(coin)
                 coin.kill()
                 self.money += 1
 
-        hits = pg.sprite.spritecollide(self.player, self.portals, False, pg.sprite.collide_mask)
-        for hit in hits:
+        with profiler.section('portals'):
+            hits = collide_masks(self.player, self.portal_grid.query(self.player.rect))
+        if hits:
             self.level += 1
-            if self.level == 3:
-                quit()
+            if self.level == COMPLETE_LEVEL:
+                self.mode = 'complete'
+                self.preloader.discard()
+                return
             self.setup()
+            return
 
-        self.player.update(self.platforms)
-
-        self.coins.update()
+        with profiler.section('player'):
+            self.player.update(self.solids, self.keys)
 
-        self.portals.update()
+        with profiler.section('animation'):
+            # Кадры всех анимаций сдвигаются общими часами, у сущностей своих таймеров нет
+            animator.advance(sim_clock.ticks())
 
-        self.fireballs.update()
+            # Шар возвращается в пул, когда уходит за край экрана — по камере, а не по координатам мира,
+            # иначе на широкой карте шары копятся за экраном и пул кончается
+            left, right = self.camera_x, self.camera_x + SCREEN_WIDTH
+            if self.fireball_batch is not None:
+                self.fireball_batch.update(left, right)
+            else:
+                self.fireballs.update(left, right)
 
         self.camera_x = self.player.rect.x - SCREEN_WIDTH // 2
         self.camera_y = self.player.rect.y - SCREEN_HEIGHT // 2
@@ -541,26 +820,80 @@ class Game:
         self.camera_x = max(0, min(self.camera_x, self.map_pixel_width - SCREEN_WIDTH))
         self.camera_y = max(0, min(self.camera_y, self.map_pixel_height - SCREEN_HEIGHT))
 
-    def draw(self):
-        self.screen.fill('light blue')
-
+    def interpolate(self, previous, current, alpha):
+        if previous is None:
+            return current
+        return (round(previous[0] + (current[0] - previous[0]) * alpha),
+                round(previous[1] + (current[1] - previous[1]) * alpha))
+
+    def draw(self, alpha=1.0):
+        with profiler.section('draw'):
+            self.render(alpha)
+
+        with profiler.section('flip'):
+            if self.dirty_rects is None:
+                pg.display.flip()
+            else:
+                pg.display.update(self.dirty_rects)
+
+    def render(self, alpha=1.0):
+        if self.renderer is None:
+            self.setup_renderer()
+        camera_x, camera_y = self.interpolate(self.previous_camera, (self.camera_x, self.camera_y), alpha)
+
+        # Накладные слои тайлов вставляются перед первым спрайтом из более позднего слоя карты;
+        # игрок, враги и шары — выше всех слоёв
+        sprites = []
+        overlays = iter(self.overlay_layers)
+        overlay = next(overlays, None)
         for sprite in self.all_sprites:
-            self.screen.blit(sprite.image, sprite.rect.move(-self.camera_x, -self.camera_y))
-
-
-        pg.draw.rect(self.screen, "black", (21, 19, self.player.hp * 10, 22))
-        pg.draw.rect(self.screen, "red", (20, 20, self.player.hp * 10, 20))
-
-        text_money = font.render(f'Количество монет: {self.money}', True, (0, 0, 0))
-        text_money_rect = text_money.get_rect(center=(SCREEN_WIDTH // 2, 15))
-        self.screen.blit(text_money, text_money_rect)
-
-        if self.mode == 'game over':
-            text = font.render('Вы проиграли', True, (255, 0, 0))
-            text_rect = text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
-            self.screen.blit(text, text_rect)
-
-        pg.display.flip()
+            while overlay is not None and getattr(sprite, 'depth', TOP_DEPTH) > overlay[0]:
+                sprites.extend(overlay[1].visible(camera_x, camera_y, SCREEN_WIDTH, SCREEN_HEIGHT))
+                overlay = next(overlays, None)
+            x, y = self.interpolate(self.previous_positions.get(sprite), sprite.rect.topleft, alpha)
+            sprites.append((sprite, sprite.image, (x - camera_x, y - camera_y)))
+        while overlay is not None:
+            sprites.extend(overlay[1].visible(camera_x, camera_y, SCREEN_WIDTH, SCREEN_HEIGHT))
+            overlay = next(overlays, None)
+
+        # Интерфейс пересобирается только при смене значений и рисуется поверх спрайтов
+        self.hud.set('hp', self.player.hp)
+        self.hud.set('money', self.money)
+        self.hud.set('message', 'Вы проиграли' if self.mode == 'game over' else None)
+        sprites += self.hud.layers()
+
+        # Оверлей профайлера перерисовывается целиком каждый кадр — с ним только полный режим
+        self.dirty_rects = self.renderer.draw(self.static_layer, (camera_x, camera_y), sprites,
+                                              full=self.overlay is not None)
+        profiler.count('blits', self.renderer.blits)
+        if self.dirty_rects is not None:
+            profiler.count('dirty_rects', len(self.dirty_rects))
+
+        if self.overlay is not None:
+            self.overlay.draw(self.screen, self.clock, {
+                'all_sprites': self.all_sprites,
+                'platforms': self.platforms,
+                'coins': self.coins,
+                'enemies': self.enemies,
+                'fireballs': self.fireballs,
+            })
+
+    def setup_hud(self):
+        # Верхняя панель — полоса здоровья и монеты, по центру — сообщение о проигрыше
+        self.hud.add('hp', 'top', self.hp_widget)
+        self.hud.add('money', 'top', lambda hud, money: hud.text_widget(
+            f'Количество монет: {money}', (0, 0, 0), center=(SCREEN_WIDTH // 2, 15)))
+        self.hud.add('message', 'center', lambda hud, message: hud.text_widget(
+            message, (255, 0, 0), center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)))
+
+    def hp_widget(self, hud, hp):
+        if hp <= 0:
+            return []
+        bar = pg.Surface((hp * 10 + 1, 22), pg.SRCALPHA)
+        bar.fill((0, 0, 0, 0))
+        pg.draw.rect(bar, "black", (1, 0, hp * 10, 22))
+        pg.draw.rect(bar, "red", (0, 1, hp * 10, 20))
+        return [(bar, bar.get_rect(topleft=(20, 19)))]
 
 
 if __name__ == "__main__":
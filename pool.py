@@ -0,0 +1,38 @@
+class SpritePool:
+    # Ограниченный пул короткоживущих спрайтов: погашенный через kill спрайт
+    # возвращается в пул и переинициализируется через reset вместо создания нового
+    def __init__(self, factory, capacity):
+        self.factory = factory
+        self.capacity = capacity
+        self.free = []
+        self.active = 0
+        self.stats = {'created': 0, 'reused': 0, 'exhausted': 0, 'peak': 0}
+
+    def __len__(self):
+        return self.active
+
+    def acquire(self, *args):
+        # None, если все спрайты пула в игре — новый сверх лимита не создаётся
+        if self.free:
+            sprite = self.free.pop()
+            sprite.reset(*args)
+            self.stats['reused'] += 1
+        elif self.active < self.capacity:
+            sprite = self.factory(*args)
+            sprite.pool = self
+            self.stats['created'] += 1
+        else:
+            self.stats['exhausted'] += 1
+            return None
+        sprite.pooled = False
+        self.active += 1
+        self.stats['peak'] = max(self.stats['peak'], self.active)
+        return sprite
+
+    def release(self, sprite):
+        # Повторный kill уже возвращённого спрайта ничего не делает
+        if sprite.pooled:
+            return
+        sprite.pooled = True
+        self.active -= 1
+        self.free.append(sprite)
@@ -0,0 +1,92 @@
+import sys
+import threading
+import traceback
+
+
+class OverBudget(Exception):
+    # Сборка уровня бросает его до того, как выделена память под тайлы и чанки
+    pass
+
+
+class LevelPreloader:
+    # Фоновая подготовка следующего уровня: разбор карты, тайлы, столкновения
+    # и спрайты собираются в рабочем потоке, переход через портал только подменяет состояние
+    def __init__(self, build, budget):
+        self.build = build
+        self.budget = budget
+        self.level = None
+        self.thread = None
+        self.cancelled = None
+        self.result = None
+        self.error = None
+        self.lock = threading.Lock()
+        self.stats = {'started': 0, 'used': 0, 'discarded': 0, 'over_budget': 0, 'failed': 0}
+
+    def start(self, level, limited=True):
+        # Уровень, который нужен прямо сейчас (limited=False), собирается без ограничения по памяти
+        if self.level == level and (self.thread is not None or self.result is not None):
+            return
+        self.discard()
+        self.level = level
+        self.cancelled = threading.Event()
+        budget = self.budget if limited else None
+        self.thread = threading.Thread(target=self.work, args=(level, self.cancelled, budget),
+                                       name=f'preload-level-{level}', daemon=True)
+        self.stats['started'] += 1
+        self.thread.start()
+
+    def work(self, level, cancelled, budget):
+        try:
+            state = self.build(level, cancelled, budget)
+        except OverBudget:
+            self.stats['over_budget'] += 1
+            return
+        except Exception as error:  # ошибка фона не должна ронять игру — уровень соберётся синхронно
+            # но молча подменять её синхронной сборкой нельзя: это та самая заминка, от которой спасает фон
+            self.error = error
+            self.stats['failed'] += 1
+            print(f'Предзагрузка уровня {level} не удалась, он соберётся синхронно:', file=sys.stderr)
+            traceback.print_exception(error, file=sys.stderr)
+            return
+        if state is None:
+            return
+        if budget is not None and state.memory_size() > budget:
+            # Оценка до сборки могла ошибиться — не держим в памяти уровень, который не влез в бюджет
+            self.stats['over_budget'] += 1
+            return
+        with self.lock:
+            if not cancelled.is_set():
+                self.result = state
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def wait(self):
+        if self.thread is not None:
+            self.thread.join()
+
+    def take(self, level):
+        # Готовое состояние уровня или None, если предзагрузка была для другого уровня или не удалась
+        if self.level != level:
+            return None
+        self.wait()
+        state = self.result
+        self.reset()
+        if state is not None:
+            self.stats['used'] += 1
+        return state
+
+    def discard(self):
+        with self.lock:
+            if self.cancelled is not None:
+                self.cancelled.set()
+            if self.thread is not None or self.result is not None:
+                self.stats['discarded'] += 1
+            self.reset()
+
+    def reset(self):
+        self.level = None
+        self.thread = None
+        self.cancelled = None
+        self.result = None
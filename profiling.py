@@ -0,0 +1,234 @@
+import cProfile
+import functools
+import json
+import time
+from collections import deque
+
+import pygame as pg
+
+
+class NullSection:
+    # Пустой контекст для выключенного профайлера — один общий объект, без аллокаций
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SECTION = NullSection()
+
+
+class Section:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        frame = self.profiler.current
+        frame[self.name] = frame.get(self.name, 0.0) + time.perf_counter() - self.start
+        return False
+
+
+class Profiler:
+    # Именованные замеры по фазам кадра. Время фазы суммируется за кадр,
+    # готовые кадры складываются в frames: [{'event': сек, 'draw': сек, ...}, ...],
+    # счётчики кадра — в counters с теми же индексами. У секции может быть бюджет в секундах:
+    # число секций, вышедших за бюджет, пишется в счётчик over_budget
+    def __init__(self, enabled=False, history=None):
+        self.enabled = False
+        self.history = history
+        self.sections = {}
+        self.budgets = {}
+        self.instrumented = []
+        self.capture_frames = 0
+        self.capture_path = None
+        self.capture_profile = None
+        self.capture_log = []
+        self.reset()
+        if enabled:
+            self.enable()
+
+    def enable(self, history=None):
+        if history is not None:
+            self.history = history
+            self.reset()
+        self.enabled = True
+        for target in self.instrumented:
+            target.wrap()
+
+    def disable(self):
+        self.enabled = False
+        if self.capture_profile is not None:
+            self.finish_capture()
+        for target in self.instrumented:
+            target.unwrap()
+
+    def section(self, name):
+        if not self.enabled:
+            return NULL_SECTION
+        section = self.sections.get(name)
+        if section is None:
+            section = self.sections[name] = Section(self, name)
+        return section
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.current_counters[name] = self.current_counters.get(name, 0) + n
+
+    def set_budget(self, name, seconds):
+        self.budgets[name] = seconds
+
+    def instrument(self, cls, method='update', name=None):
+        # Замер метода класса. Обёртка ставится только на время включённого профайлера,
+        # в выключенном состоянии вызывается исходный метод без накладных расходов
+        target = InstrumentedMethod(self, cls, method, name or f'{cls.__name__}.{method}')
+        self.instrumented.append(target)
+        if self.enabled:
+            target.wrap()
+
+    def begin_frame(self):
+        # Выключенный профайлер не заводит словари кадра
+        if not self.enabled:
+            return
+        self.current = {}
+        self.current_counters = {}
+        self.frame_start = time.perf_counter()
+        if self.capture_frames and self.capture_profile is None:
+            self.capture_profile = cProfile.Profile()
+            self.capture_profile.enable()
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        self.current['frame'] = time.perf_counter() - self.frame_start
+        over = sum(1 for name, budget in self.budgets.items() if self.current.get(name, 0.0) > budget)
+        if over:
+            self.current_counters['over_budget'] = over
+        self.frames.append(self.current)
+        self.counters.append(self.current_counters)
+        if self.capture_profile is not None:
+            self.capture_log.append({'timings': self.current, 'counters': self.current_counters})
+            self.capture_frames -= 1
+            if self.capture_frames <= 0:
+                self.finish_capture()
+        self.current = {}
+        self.current_counters = {}
+
+    def capture(self, frames, path):
+        # Снять cProfile за следующие frames кадров: path.prof для pstats/snakeviz
+        # и path.json с покадровыми замерами того же окна
+        self.capture_frames = frames
+        self.capture_path = path
+        self.capture_log = []
+
+    def finish_capture(self):
+        self.capture_profile.disable()
+        self.capture_profile.dump_stats(f'{self.capture_path}.prof')
+        with open(f'{self.capture_path}.json', 'w') as f:
+            json.dump(self.capture_log, f)
+        self.capture_profile = None
+        self.capture_frames = 0
+        self.capture_log = []
+
+    def reset(self):
+        self.current = {}
+        self.current_counters = {}
+        self.frame_start = time.perf_counter()
+        self.frames = deque(maxlen=self.history)
+        self.counters = deque(maxlen=self.history)
+
+
+class InstrumentedMethod:
+    def __init__(self, profiler, cls, method, name):
+        self.profiler = profiler
+        self.cls = cls
+        self.method = method
+        self.name = name
+        self.original = None
+
+    def wrap(self):
+        if self.original is not None:
+            return
+        self.original = self.cls.__dict__[self.method]
+        original = self.original
+        section = self.profiler.section(self.name)
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            with section:
+                return original(*args, **kwargs)
+
+        setattr(self.cls, self.method, timed)
+
+    def unwrap(self):
+        if self.original is not None:
+            setattr(self.cls, self.method, self.original)
+            self.original = None
+
+
+class ProfilerOverlay:
+    # Оверлей под полоской здоровья: FPS, график времени кадра, размеры групп,
+    # проверки столкновений, число блитов и секции с бюджетом за последний кадр
+    GRAPH_WIDTH = 240
+    GRAPH_HEIGHT = 60
+    GRAPH_SCALE_MS = 25
+    LINE_HEIGHT = 18
+
+    def __init__(self, profiler, font):
+        self.profiler = profiler
+        self.font = font
+        self.surface = None
+
+    def draw(self, screen, clock, groups, position=(20, 50)):
+        frames = self.profiler.frames
+        counters = self.profiler.counters[-1] if self.profiler.counters else {}
+        last = frames[-1] if frames else {}
+
+        lines = [f'FPS: {clock.get_fps():.0f}  кадр: {last.get("frame", 0.0) * 1000:.2f} мс']
+        lines += [f'{name}: {len(group)}' for name, group in groups.items()]
+        lines += [f'{name}: {value}' for name, value in sorted(counters.items())]
+        lines = [(line, (255, 255, 255)) for line in lines]
+        for name, budget in self.profiler.budgets.items():
+            ms = last.get(name, 0.0) * 1000
+            color = (255, 255, 255) if ms <= budget * 1000 else (230, 80, 60)
+            lines.append((f'{name}: {ms:.2f} / {budget * 1000:.2f} мс', color))
+
+        # График — сверху, под ним строки: его место не зависит от числа счётчиков и секций.
+        # Строки, не помещающиеся на экран под графиком, сворачиваются в одну
+        top = 6 + self.GRAPH_HEIGHT + 6
+        fit = max(1, (screen.get_height() - position[1] - top - 6) // self.LINE_HEIGHT)
+        if len(lines) > fit:
+            hidden = len(lines) - fit + 1
+            lines = lines[:fit - 1] + [(f'... ещё {hidden}', (255, 255, 255))]
+        height = top + len(lines) * self.LINE_HEIGHT + 6
+        if self.surface is None or self.surface.get_height() < height:
+            self.surface = pg.Surface((self.GRAPH_WIDTH + 20, height), pg.SRCALPHA)
+        surface = self.surface
+        surface.fill((0, 0, 0, 150))
+
+        # График времени кадра: по столбику на кадр, линия — бюджет 1/60 с
+        graph = pg.Rect(10, 6, self.GRAPH_WIDTH, self.GRAPH_HEIGHT)
+        pg.draw.rect(surface, (40, 40, 40, 200), graph)
+        history = list(frames)[-self.GRAPH_WIDTH:]
+        for i, frame in enumerate(history):
+            ms = frame.get('frame', 0.0) * 1000
+            bar = min(self.GRAPH_HEIGHT, int(ms / self.GRAPH_SCALE_MS * self.GRAPH_HEIGHT))
+            color = (90, 220, 90) if ms < 1000 / 60 else (230, 80, 60)
+            pg.draw.line(surface, color, (graph.left + i, graph.bottom - 1), (graph.left + i, graph.bottom - bar))
+        budget = graph.bottom - int(1000 / 60 / self.GRAPH_SCALE_MS * self.GRAPH_HEIGHT)
+        pg.draw.line(surface, (255, 255, 0), (graph.left, budget), (graph.right, budget))
+
+        y = top
+        for line, color in lines:
+            surface.blit(self.font.render(line, True, color), (10, y))
+            y += self.LINE_HEIGHT
+
+        screen.blit(surface, position, (0, 0, surface.get_width(), height))
+
+profiler = Profiler()
@@ -0,0 +1,217 @@
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+
+import pygame as pg
+
+from controls import KeyState
+
+# Запись сессии: заголовок, JSON с метаданными и сжатые zlib кадры.
+# Кадр — число шагов симуляции, маска зажатых клавиш и события очереди в том порядке, в каком их получила игра
+MAGIC = b'PREC'
+VERSION = 1
+HEADER = struct.Struct('<4sII')
+FRAME = struct.Struct('<BBH')  # шаги, маска клавиш, число событий
+EVENT = struct.Struct('<Bi')  # вид события, клавиша
+RECORDED_KEYS = (pg.K_a, pg.K_d, pg.K_SPACE, pg.K_LSHIFT)  # клавиши, состояние которых читает игра
+CHECKPOINT_INTERVAL = 60  # Кадров между контрольными точками
+EVENT_KEYDOWN, EVENT_KEYUP, EVENT_QUIT, EVENT_OTHER = range(4)
+
+
+class ReplayMismatch(Exception):
+    pass
+
+
+def snapshot(game):
+    # Что сверяется на контрольных точках
+    return [game.level, game.player.rect.x, game.player.rect.y, game.player.hp, game.money]
+
+
+def encode_event(event):
+    if event.type == pg.KEYDOWN:
+        return EVENT_KEYDOWN, event.key
+    if event.type == pg.KEYUP:
+        return EVENT_KEYUP, event.key
+    if event.type == pg.QUIT:
+        return EVENT_QUIT, 0
+    # Остальные события игре не важны, но каждое из них — лишняя проверка выстрела
+    return EVENT_OTHER, 0
+
+
+def decode_event(kind, key):
+    if kind == EVENT_KEYDOWN:
+        return pg.event.Event(pg.KEYDOWN, key=key)
+    if kind == EVENT_KEYUP:
+        return pg.event.Event(pg.KEYUP, key=key)
+    if kind == EVENT_QUIT:
+        return pg.event.Event(pg.QUIT)
+    return pg.event.Event(pg.USEREVENT)
+
+
+class Recording:
+    def __init__(self, level=1, start_ticks=0):
+        self.level = level
+        self.start_ticks = start_ticks
+        self.frames = []
+        self.checkpoints = []
+
+    def __len__(self):
+        return len(self.frames)
+
+    def save(self, path):
+        body = bytearray()
+        for steps, mask, events in self.frames:
+            body += FRAME.pack(steps, mask, len(events))
+            for kind, key in events:
+                body += EVENT.pack(kind, key)
+        meta = json.dumps({
+            'level': self.level,
+            'start_ticks': self.start_ticks,
+            'keys': [pg.key.name(key) for key in RECORDED_KEYS],
+            'frames': len(self.frames),
+            'checkpoints': self.checkpoints,
+        }).encode()
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(meta)))
+            f.write(meta)
+            f.write(zlib.compress(bytes(body), 9))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, meta_size = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path}: неподдерживаемый формат записи')
+        meta = json.loads(data[HEADER.size:HEADER.size + meta_size])
+        if meta['keys'] != [pg.key.name(key) for key in RECORDED_KEYS]:
+            raise ValueError(f'{path}: запись сделана с другим набором клавиш')
+        body = zlib.decompress(data[HEADER.size + meta_size:])
+
+        recording = cls(meta['level'], meta['start_ticks'])
+        recording.checkpoints = meta['checkpoints']
+        offset = 0
+        for _ in range(meta['frames']):
+            steps, mask, count = FRAME.unpack_from(body, offset)
+            offset += FRAME.size
+            events = tuple(EVENT.unpack_from(body, offset + i * EVENT.size) for i in range(count))
+            offset += count * EVENT.size
+            recording.frames.append((steps, mask, events))
+        return recording
+
+
+class InputRecorder:
+    # Обёртка над источником ввода: отдаёт игре то же, что источник, и пишет каждый кадр в запись
+    def __init__(self, source, recording, checkpoint_interval=CHECKPOINT_INTERVAL):
+        self.source = source
+        self.recording = recording
+        self.checkpoint_interval = checkpoint_interval
+        self.pending = None
+
+    def poll(self):
+        events, keys = self.source.poll()
+        mask = 0
+        for bit, key in enumerate(RECORDED_KEYS):
+            if keys[key]:
+                mask |= 1 << bit
+        self.pending = (mask, tuple(encode_event(event) for event in events))
+        return events, keys
+
+    def steps(self, scheduled):
+        return self.source.steps(scheduled)
+
+    def end_frame(self, game, steps):
+        mask, events = self.pending
+        self.recording.frames.append((steps, mask, events))
+        frame = len(self.recording.frames)
+        if frame % self.checkpoint_interval == 0:
+            self.recording.checkpoints.append([frame] + snapshot(game))
+        self.source.end_frame(game, steps)
+
+
+class ReplayInput:
+    # Воспроизведение записи кадр в кадр: те же события, клавиши и число шагов симуляции.
+    # На контрольных точках состояние игры сверяется с записанным
+    def __init__(self, recording, strict=True):
+        self.recording = recording
+        self.strict = strict
+        self.frame = 0
+        self.expected = {checkpoint[0]: checkpoint[1:] for checkpoint in recording.checkpoints}
+        self.checked = 0
+        self.mismatches = []
+
+    @property
+    def finished(self):
+        return self.frame >= len(self.recording.frames)
+
+    def poll(self):
+        if self.finished:
+            return [], KeyState()
+        _, mask, events = self.recording.frames[self.frame]
+        keys = KeyState(key for bit, key in enumerate(RECORDED_KEYS) if mask & (1 << bit))
+        return [decode_event(kind, key) for kind, key in events], keys
+
+    def steps(self, scheduled):
+        if self.finished:
+            return scheduled
+        return self.recording.frames[self.frame][0]
+
+    def end_frame(self, game, steps):
+        self.frame += 1
+        expected = self.expected.get(self.frame)
+        if expected is None:
+            return
+        self.checked += 1
+        actual = snapshot(game)
+        if actual != expected:
+            self.mismatches.append((self.frame, expected, actual))
+            if self.strict:
+                raise ReplayMismatch(f'кадр {self.frame}: ожидалось (уровень, x, y, hp, монеты) {expected}, '
+                                     f'получено {actual}')
+
+
+def replay(game, render=False):
+    # Прогон записи на уже созданной игре; возвращает время каждого кадра
+    frame_times = []
+    game.is_running = True
+    while not game.input.finished and game.is_running and game.mode != 'complete':
+        start = time.perf_counter()
+        game.frame(render)
+        frame_times.append(time.perf_counter() - start)
+    return frame_times
+
+
+def main_replay():
+    parser = argparse.ArgumentParser(description='Воспроизведение записанной сессии с проверкой контрольных точек')
+    parser.add_argument('path')
+    parser.add_argument('--render', action='store_true', help='отрисовывать кадры (dummy-драйвер)')
+    parser.add_argument('--keep-going', action='store_true', help='не останавливаться на первом расхождении')
+    args = parser.parse_args()
+
+    # Воспроизведение без окна, как bench.py и balance.py: main поднимает дисплей при импорте
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    from main import Game
+
+    recording = Recording.load(args.path)
+    inputs = ReplayInput(recording, strict=not args.keep_going)
+    game = Game(headless=True, inputs=inputs, level=recording.level, start_ticks=recording.start_ticks)
+    try:
+        frame_times = replay(game, args.render)
+    except ReplayMismatch as error:
+        print(f'{args.path}: расхождение — {error}', file=sys.stderr)
+        return 1
+
+    total = sum(frame_times)
+    print(f'{args.path}: {len(frame_times)} кадров из {len(recording)}, '
+          f'контрольных точек {inputs.checked}, расхождений {len(inputs.mismatches)}, '
+          f'{total * 1000 / max(1, len(frame_times)):.3f} мс/кадр')
+    return 1 if inputs.mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_replay())
@@ -0,0 +1,255 @@
+import pygame as pg
+
+from profiling import profiler
+
+CHUNK_SIZE = 512
+PARALLAX_PATH = 'maps/tileset/2 Background/Layers'
+# Слои фона от дальнего к ближнему: файл, доля смещения камеры, бюджет слоя в мс
+PARALLAX_LAYERS = (
+    ('1.png', 0.0, 1.0),
+    ('2.png', 0.1, 1.0),
+    ('3.png', 0.2, 1.0),
+    ('4.png', 0.35, 0.3),
+    ('5.png', 0.5, 0.3),
+)
+PARALLAX_MARGIN = 96  # Запас высоты слоя под вертикальную прокрутку
+
+
+class ChunkedLayer:
+    # Статические тайлы запекаются один раз в крупные поверхности-чанки,
+    # каждый кадр рисуются только чанки, попавшие в окно камеры
+    def __init__(self, sprites, map_width, map_height, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.columns = (map_width + chunk_size - 1) // chunk_size
+        self.rows = (map_height + chunk_size - 1) // chunk_size
+        self.chunks = {}
+
+        for sprite in sprites:
+            x1 = sprite.rect.left // chunk_size
+            y1 = sprite.rect.top // chunk_size
+            x2 = (sprite.rect.right - 1) // chunk_size
+            y2 = (sprite.rect.bottom - 1) // chunk_size
+            # Тайл на границе чанков запекается в каждый из них
+            for cy in range(y1, y2 + 1):
+                for cx in range(x1, x2 + 1):
+                    chunk = self.get_chunk(cx, cy)
+                    chunk.blit(sprite.image, sprite.rect.move(-cx * chunk_size, -cy * chunk_size))
+
+    def get_chunk(self, cx, cy):
+        chunk = self.chunks.get((cx, cy))
+        if chunk is None:
+            chunk = pg.Surface((self.chunk_size, self.chunk_size), pg.SRCALPHA).convert_alpha()
+            chunk.fill((0, 0, 0, 0))
+            self.chunks[(cx, cy)] = chunk
+        return chunk
+
+    def visible_chunks(self, view):
+        x1 = max(0, view.left // self.chunk_size)
+        y1 = max(0, view.top // self.chunk_size)
+        x2 = min(self.columns - 1, (view.right - 1) // self.chunk_size)
+        y2 = min(self.rows - 1, (view.bottom - 1) // self.chunk_size)
+        for cy in range(y1, y2 + 1):
+            for cx in range(x1, x2 + 1):
+                chunk = self.chunks.get((cx, cy))
+                if chunk is not None:
+                    yield cx, cy, chunk
+
+    def draw(self, screen, camera_x, camera_y):
+        view = pg.Rect(camera_x, camera_y, screen.get_width(), screen.get_height())
+        blits = 0
+        for cx, cy, chunk in self.visible_chunks(view):
+            screen.blit(chunk, (cx * self.chunk_size - camera_x, cy * self.chunk_size - camera_y))
+            blits += 1
+        return blits
+
+    def visible(self, camera_x, camera_y, width, height):
+        # Видимые чанки как записи отрисовки поверх спрайтов: (ключ, изображение, позиция на экране)
+        view = pg.Rect(camera_x, camera_y, width, height)
+        for cx, cy, chunk in self.visible_chunks(view):
+            yield (self, cx, cy), chunk, (cx * self.chunk_size - camera_x, cy * self.chunk_size - camera_y)
+
+    def memory_size(self):
+        return sum(chunk.get_width() * chunk.get_height() * chunk.get_bytesize() for chunk in self.chunks.values())
+
+
+class ParallaxLayer:
+    # Слой масштабируется один раз под высоту экрана с запасом, справа к нему приклеивается копия
+    # его начала шириной в экран. Видимая часть при любом смещении — один blit с area из этой полосы
+    def __init__(self, name, image, factor, budget, screen_size, margin=PARALLAX_MARGIN):
+        self.section = f'parallax.{name}'
+        self.factor = factor
+        self.budget = budget
+        self.margin = margin
+        screen_width, screen_height = screen_size
+        height = screen_height + margin
+        width = round(image.get_width() * height / image.get_height())
+        self.width = width
+        self.color = None
+        self.strip = None
+
+        colorkey = image.get_colorkey()
+        image = image.convert()
+        color = image.get_at((0, 0))
+        if colorkey is None and pg.mask.from_threshold(image, color, (1, 1, 1, 255)).count() == \
+                image.get_width() * image.get_height():
+            # Однотонный непрозрачный слой (небо) — заливка вместо blit, полоса не нужна
+            self.color = color[:3]
+            return
+
+        scaled = pg.transform.scale(image, (width, height))
+        self.strip = pg.Surface((width + screen_width, height)).convert()
+        for x in range(0, width + screen_width, width):
+            self.strip.blit(scaled, (x, 0))
+        if colorkey is not None:
+            # 32 бита с RLE: почти прозрачные слои (вода, трава) копируют только свои пиксели
+            self.strip.set_colorkey(colorkey[:3], pg.RLEACCEL)
+
+    def draw(self, surface, camera_x, camera_y):
+        if self.color is not None:
+            surface.fill(self.color)
+            return 1
+        x = int(camera_x * self.factor) % self.width
+        y = min(self.margin, max(0, int(camera_y * self.factor)))
+        surface.blit(self.strip, (0, 0), (x, y, surface.get_width(), surface.get_height()))
+        return 1
+
+    def memory_size(self):
+        if self.strip is None:
+            return 0
+        return self.strip.get_width() * self.strip.get_height() * self.strip.get_bytesize()
+
+
+class ParallaxBackground:
+    # Фон из нескольких слоёв с разной скоростью прокрутки. Время каждого слоя — отдельная
+    # секция профайлера со своим бюджетом: превышения видны в оверлее и в bench.py
+    # С deferred=True слои не строятся сразу: load_next() масштабирует по одному слою,
+    # чтобы экран загрузки успевал перерисовываться между ними
+    def __init__(self, screen_size, path=PARALLAX_PATH, layers=PARALLAX_LAYERS, deferred=False):
+        self.screen_size = screen_size
+        self.path = path
+        self.pending = list(layers)
+        self.total = len(self.pending)
+        self.layers = []
+        if not deferred:
+            while self.pending:
+                self.load_next()
+
+    def load_next(self):
+        filename, factor, budget = self.pending.pop(0)
+        name = filename.rsplit('.', 1)[0]
+        layer = ParallaxLayer(name, pg.image.load(f'{self.path}/{filename}'), factor, budget, self.screen_size)
+        profiler.set_budget(layer.section, layer.budget / 1000)
+        self.layers.append(layer)
+        return 1 - len(self.pending) / self.total
+
+    def draw(self, surface, camera_x, camera_y):
+        blits = 0
+        for layer in self.layers:
+            with profiler.section(layer.section):
+                blits += layer.draw(surface, camera_x, camera_y)
+        return blits
+
+    def memory_size(self):
+        return sum(layer.memory_size() for layer in self.layers)
+
+
+class DirtyRectRenderer:
+    # Пока камера стоит, фон (параллакс и статический слой) берётся из запомненной поверхности,
+    # а перерисовываются только прямоугольники спрайтов, которые сдвинулись или сменили кадр.
+    # При прокрутке — обычная полная перерисовка и flip
+    def __init__(self, screen, background):
+        self.screen = screen
+        # background — объект с draw(поверхность, camera_x, camera_y) или просто цвет заливки
+        self.background_layer = background
+        self.background = None
+        self.background_camera = None
+        self.last_camera = None
+        self.drawn = {}
+        self.blits = 0
+
+    def reset(self):
+        self.background_camera = None
+        self.last_camera = None
+        self.drawn = {}
+
+    def draw(self, layer, camera, sprites, full=False):
+        # sprites — [(ключ, изображение, позиция на экране)] в порядке отрисовки, включая слои интерфейса.
+        # Результат — прямоугольники для display.update или None, если обновить нужно весь экран
+        screen_rect = self.screen.get_rect()
+        stationary = camera == self.last_camera and not full
+        self.last_camera = camera
+
+        current = {}
+        for sprite, image, position in sprites:
+            rect = image.get_rect(topleft=position)
+            if rect.colliderect(screen_rect):
+                current[sprite] = (image, rect)
+
+        if stationary and self.background_camera == camera:
+            return self.draw_dirty(current, screen_rect)
+
+        if stationary:
+            # Камера остановилась — фон запоминается один раз, дальше кадры частичные
+            if self.background is None:
+                self.background = pg.Surface(self.screen.get_size()).convert()
+            self.blits = self.draw_background(self.background, camera) + layer.draw(self.background, *camera) + 1
+            self.screen.blit(self.background, (0, 0))
+            self.background_camera = camera
+        else:
+            self.blits = self.draw_background(self.screen, camera) + layer.draw(self.screen, *camera)
+            self.background_camera = None
+
+        for image, rect in current.values():
+            self.screen.blit(image, rect)
+        self.blits += len(current)
+        self.drawn = current
+        return None
+
+    def draw_background(self, surface, camera):
+        if hasattr(self.background_layer, 'draw'):
+            return self.background_layer.draw(surface, *camera)
+        surface.fill(self.background_layer)
+        return 0
+
+    def draw_dirty(self, current, screen_rect):
+        dirty = []
+        for sprite in self.drawn.keys() | current.keys():
+            before = self.drawn.get(sprite)
+            after = current.get(sprite)
+            if before == after:
+                continue
+            if before is not None:
+                dirty.append(before[1])
+            if after is not None:
+                dirty.append(after[1])
+        dirty = merge_rects(rect.clip(screen_rect) for rect in dirty)
+
+        # Каждая область восстанавливается и дорисовывается с отсечением по ней самой:
+        # полупрозрачные края спрайтов, лишь задетых областью, не накладываются повторно
+        self.blits = 0
+        for rect in dirty:
+            self.screen.set_clip(rect)
+            self.screen.blit(self.background, rect, rect)
+            self.blits += 1
+            for image, sprite_rect in current.values():
+                if sprite_rect.colliderect(rect):
+                    self.screen.blit(image, sprite_rect)
+                    self.blits += 1
+        self.screen.set_clip(None)
+        self.drawn = current
+        return dirty
+
+
+def merge_rects(rects):
+    # Пересекающиеся прямоугольники сливаются, чтобы ни один пиксель не перерисовывался дважды
+    merged = []
+    for rect in rects:
+        if not rect.width or not rect.height:
+            continue
+        rect = rect.copy()
+        index = rect.collidelist(merged)
+        while index != -1:
+            rect.union_ip(merged.pop(index))
+            index = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
@@ -0,0 +1,246 @@
+from collections import OrderedDict
+
+import pygame as pg
+
+from preload import OverBudget
+
+STREAM_CHUNK_TILES = 16  # Сторона чанка в тайлах
+STREAM_MEMORY_CAP = 32 * 1024 * 1024  # Сколько байт могут занимать загруженные чанки
+STATIC_LAYERS = ('platforms', 'decorations')
+
+
+class MapChunk:
+    def __init__(self, surface, platforms):
+        self.surface = surface
+        self.platforms = platforms
+
+    def memory_size(self):
+        if self.surface is None:
+            return 0
+        return self.surface.get_width() * self.surface.get_height() * self.surface.get_bytesize()
+
+
+class StreamBudget:
+    # Общий бюджет памяти всех потоковых слоёв уровня: их чанки и изображения тайлов платформ,
+    # которые остаются в кеше тайлов уровня. Чанки выгружаются по LRU сразу по всем слоям
+    def __init__(self, memory_cap=STREAM_MEMORY_CAP):
+        self.memory_cap = memory_cap
+        self.memory = 0
+        self.images = set()
+        self.layers = []
+        self.chunks = OrderedDict()  # (слой, ключ чанка) в порядке последнего использования
+
+    def update(self, view):
+        # Сначала закрепляются чанки под экраном во всех слоях, потом подгружается запас
+        for layer in self.layers:
+            layer.pin(view)
+        if not self.evict():
+            raise OverBudget(f'чанки под экраном занимают {self.memory} байт при бюджете {self.memory_cap}')
+        # Запас всех слоёв — от ближних к экрану чанков к дальним и только пока есть место
+        spare = sorted((distance, index, key) for index, layer in enumerate(self.layers)
+                       for distance, key in layer.spare(view))
+        for _, index, key in spare:
+            layer = self.layers[index]
+            if key in layer.chunks or self.evict(layer.chunk_bytes, keep=True):
+                layer.use(key)
+
+    def add_image(self, image):
+        if image not in self.images:
+            self.images.add(image)
+            self.memory += image.get_width() * image.get_height() * image.get_bytesize()
+
+    def touch(self, layer, key):
+        self.chunks[(layer, key)] = None
+        self.chunks.move_to_end((layer, key))
+
+    def evict(self, size=0, keep=False):
+        # Выгружает самые давние незакреплённые чанки, пока не освободится место под size байт.
+        # С keep=True не трогает и запас вокруг экрана — подгрузка запаса не выгоняет другой запас
+        for layer, key in list(self.chunks):
+            if self.memory + size <= self.memory_cap:
+                break
+            if key in layer.pinned or keep and key in layer.resident:
+                continue
+            layer.unload(key)
+        return self.memory + size <= self.memory_cap
+
+
+class StreamingMap:
+    # Карта, которая держит в памяти только чанки рядом с камерой. Чанк строится по сеткам
+    # слоёв из пакета уровня: запечённая графика для отрисовки и спрайты его платформ.
+    # Чанки под экраном закреплены, запас вокруг подгружается, пока хватает общего бюджета слоёв (StreamBudget);
+    # дальние чанки выгружаются по LRU. Если не помещаются даже закреплённые — OverBudget.
+    # Сущности вне активной области замораживаются по чанкам и возвращаются, когда область до них дойдёт
+    def __init__(self, level_map, make_platform, platforms, scale=1,
+                 chunk_tiles=STREAM_CHUNK_TILES, budget=None, layers=STATIC_LAYERS):
+        self.level_map = level_map
+        self.make_platform = make_platform
+        self.platforms = platforms
+        self.chunk_tiles = chunk_tiles
+        self.chunk_width = chunk_tiles * level_map.tilewidth * scale
+        self.chunk_height = chunk_tiles * level_map.tileheight * scale
+        self.columns = (level_map.width + chunk_tiles - 1) // chunk_tiles
+        self.rows = (level_map.height + chunk_tiles - 1) // chunk_tiles
+        self.chunk_bytes = self.chunk_width * self.chunk_height * 4
+        self.budget = budget if budget is not None else StreamBudget()
+        self.budget.layers.append(self)
+        self.layers = [(name, gids) for name, gids in level_map.layers if name in layers]
+        self.chunks = OrderedDict()
+        self.pinned = set()
+        self.resident = set()
+        self.memory = 0
+        self.frozen = {}
+        self.live = {}  # чанк -> неподвижные сущности (монеты), которые сейчас в игре
+        self.active = None  # ключи чанков активной области; None — ещё не считались, в игре всё
+        self.active_bounds = None
+        self.stats = {'loaded': 0, 'evicted': 0, 'frozen': 0, 'thawed': 0}
+
+    def chunk_keys(self, area):
+        x1 = max(0, area.left // self.chunk_width)
+        y1 = max(0, area.top // self.chunk_height)
+        x2 = min(self.columns - 1, (area.right - 1) // self.chunk_width)
+        y2 = min(self.rows - 1, (area.bottom - 1) // self.chunk_height)
+        return [(cx, cy) for cy in range(y1, y2 + 1) for cx in range(x1, x2 + 1)]
+
+    def active_area(self, view):
+        # Сущности двигаются только в пределах чанка от экрана, вокруг них всегда загружен ещё один
+        return view.inflate(self.chunk_width * 2, self.chunk_height * 2)
+
+    def resident_area(self, view):
+        return view.inflate(self.chunk_width * 4, self.chunk_height * 4)
+
+    def update(self, view):
+        # Обновляет все слои с общим бюджетом, не только этот
+        self.budget.update(view)
+
+    def pin(self, view):
+        self.pinned = set(self.chunk_keys(view))
+        self.resident = set(self.chunk_keys(self.resident_area(view)))
+        for key in self.pinned:
+            self.use(key)
+
+    def spare(self, view):
+        # Чанки запаса вокруг экрана с расстоянием (в чанках) от его центра
+        center_x, center_y = view.centerx // self.chunk_width, view.centery // self.chunk_height
+        return [(max(abs(cx - center_x), abs(cy - center_y)), (cx, cy)) for cx, cy in self.resident - self.pinned]
+
+    def use(self, key):
+        if key not in self.chunks:
+            self.load(key)
+        self.budget.touch(self, key)
+
+    def load(self, key):
+        level_map = self.level_map
+        cx, cy = key
+        tx1, ty1 = cx * self.chunk_tiles, cy * self.chunk_tiles
+        tx2 = min(level_map.width, tx1 + self.chunk_tiles)
+        ty2 = min(level_map.height, ty1 + self.chunk_tiles)
+        origin_x, origin_y = cx * self.chunk_width, cy * self.chunk_height
+
+        surface = None
+        platforms = []
+        for name, gids in self.layers:
+            for ty in range(ty1, ty2):
+                # Из сетки слоя читается только строка чанка — остальная карта в память не попадает
+                row = gids[ty * level_map.width + tx1:ty * level_map.width + tx2]
+                for offset, gid in enumerate(row):
+                    tile = level_map.get_tile_image_by_gid(gid)
+                    if not tile:
+                        continue
+                    tx = tx1 + offset
+                    platform = self.make_platform(tile, tx * level_map.tilewidth, ty * level_map.tileheight)
+                    self.budget.add_image(platform.image)
+                    if surface is None:
+                        surface = pg.Surface((self.chunk_width, self.chunk_height), pg.SRCALPHA).convert_alpha()
+                        surface.fill((0, 0, 0, 0))
+                    surface.blit(platform.image, platform.rect.move(-origin_x, -origin_y))
+                    if name == 'platforms':
+                        self.platforms.add(platform)
+                        platforms.append(platform)
+
+        chunk = MapChunk(surface, platforms)
+        self.chunks[key] = chunk
+        self.memory += chunk.memory_size()
+        self.budget.memory += chunk.memory_size()
+        self.stats['loaded'] += 1
+
+    def unload(self, key):
+        chunk = self.chunks.pop(key)
+        del self.budget.chunks[(self, key)]
+        self.platforms.remove(*chunk.platforms)
+        self.memory -= chunk.memory_size()
+        self.budget.memory -= chunk.memory_size()
+        self.stats['evicted'] += 1
+
+    def chunk_of(self, sprite):
+        cx = min(max(0, sprite.rect.centerx // self.chunk_width), self.columns - 1)
+        cy = min(max(0, sprite.rect.centery // self.chunk_height), self.rows - 1)
+        return cx, cy
+
+    def activate(self, view):
+        # Чанки, вошедшие в активную область и вышедшие из неё с прошлого вызова.
+        # Пока камера не пересекла границу чанка, ничего не пересчитывается
+        area = self.active_area(view)
+        bounds = (area.left // self.chunk_width, area.top // self.chunk_height,
+                  (area.right - 1) // self.chunk_width, (area.bottom - 1) // self.chunk_height)
+        if bounds == self.active_bounds:
+            return (), ()
+        self.active_bounds = bounds
+        keys = set(self.chunk_keys(area))
+        if self.active is None:
+            # Первый вызов: в игре весь уровень, замораживается всё за пределами области
+            everything = {(cx, cy) for cy in range(self.rows) for cx in range(self.columns)}
+            entered, left = set(), everything - keys
+        else:
+            entered, left = keys - self.active, self.active - keys
+        self.active = keys
+        return entered, left
+
+    def is_active(self, sprite):
+        return self.active is None or self.chunk_of(sprite) in self.active
+
+    def track(self, sprite):
+        # Неподвижная сущность в игре — заморозится вместе со своим чанком
+        self.live.setdefault(self.chunk_of(sprite), []).append(sprite)
+
+    def freeze_chunk(self, key):
+        # Неподвижные сущности чанка, вышедшего из активной области; уже собранные монеты пропускаются
+        sprites = [sprite for sprite in self.live.pop(key, ()) if sprite.alive()]
+        for sprite in sprites:
+            self.freeze(sprite, key)
+        return sprites
+
+    def freeze(self, sprite, key=None):
+        if key is None:
+            key = self.chunk_of(sprite)
+        self.frozen.setdefault(key, []).append(sprite)
+        self.stats['frozen'] += 1
+
+    def thaw(self, keys):
+        # Замороженные сущности чанков, вошедших в активную область, — в том состоянии, в каком их остановили
+        thawed = []
+        for key in keys:
+            thawed.extend(self.frozen.pop(key, ()))
+        self.stats['thawed'] += len(thawed)
+        return thawed
+
+    def draw(self, screen, camera_x, camera_y):
+        view = pg.Rect(camera_x, camera_y, screen.get_width(), screen.get_height())
+        blits = 0
+        for key in self.chunk_keys(view):
+            chunk = self.chunks.get(key)
+            if chunk is not None and chunk.surface is not None:
+                screen.blit(chunk.surface, (key[0] * self.chunk_width - camera_x, key[1] * self.chunk_height - camera_y))
+                blits += 1
+        return blits
+
+    def visible(self, camera_x, camera_y, width, height):
+        view = pg.Rect(camera_x, camera_y, width, height)
+        for key in self.chunk_keys(view):
+            chunk = self.chunks.get(key)
+            if chunk is not None and chunk.surface is not None:
+                yield (self, key), chunk.surface, (key[0] * self.chunk_width - camera_x,
+                                                   key[1] * self.chunk_height - camera_y)
+
+    def memory_size(self):
+        return self.memory
@@ -0,0 +1,76 @@
+import time
+
+
+class FixedStep:
+    # Планировщик с аккумулятором: симуляция идёт шагами фиксированной длины,
+    # отрисовка — сколько успевает, между шагами позиции интерполируются
+    def __init__(self, rate, max_steps=5, clock=time.perf_counter):
+        self.step = 1 / rate
+        self.max_steps = max_steps
+        self.clock = clock
+        self.accumulator = 0.0
+        self.previous = None
+        self.dropped = 0
+
+    def reset(self):
+        self.accumulator = 0.0
+        self.previous = None
+
+    def advance(self):
+        # Возвращает количество шагов симуляции, которые нужно выполнить в этом кадре
+        now = self.clock()
+        if self.previous is None:
+            self.previous = now - self.step
+        self.accumulator += now - self.previous
+        self.previous = now
+
+        steps = int(self.accumulator // self.step)
+        if steps > self.max_steps:
+            # Не догоняем бесконечно после долгого кадра — лишнее время отбрасывается
+            self.dropped += steps - self.max_steps
+            steps = self.max_steps
+            self.accumulator = 0.0
+        else:
+            self.accumulator -= steps * self.step
+        return steps
+
+    @property
+    def alpha(self):
+        # Доля следующего шага, прошедшая с момента последнего обновления
+        return min(self.accumulator / self.step, 1.0)
+
+
+class SimulationClock:
+    # Время симуляции в миллисекундах вместо pg.time.get_ticks(): растёт только
+    # на шагах симуляции, поэтому прогон не зависит от скорости машины
+    def __init__(self, rate, start=0):
+        self.rate = rate
+        self.reset(start)
+
+    def reset(self, start=0):
+        self.start = start
+        self.tick = 0
+
+    def advance(self):
+        self.tick += 1
+
+    def ticks(self):
+        return self.start + self.tick * 1000 // self.rate
+
+
+class StartupTimer:
+    # Отметки этапов запуска в секундах от start — от самого начала main.py, до импорта pygame
+    def __init__(self, start=None):
+        self.start = time.perf_counter() if start is None else start
+        self.marks = {}
+
+    def mark(self, name):
+        if name not in self.marks:
+            self.marks[name] = time.perf_counter() - self.start
+        return self.marks[name]
+
+    def report(self, budgets):
+        # Этапы с превышением бюджета — по ним видно регрессию времени запуска
+        over = {name: seconds for name, seconds in self.marks.items()
+                if name in budgets and seconds > budgets[name]}
+        return {'marks': dict(self.marks), 'budgets': dict(budgets), 'over_budget': over}